@@ -10,11 +10,65 @@ class Settings(BaseSettings):
     enviroment: str
     database_host: str
     database_port: int
+    db_pool_size: int = 5
+    db_max_overflow: int = 10
+    db_job_pool_size: int = 5
+    db_job_max_overflow: int = 5
+    db_pool_timeout_seconds: float = 30.0
+    db_pool_recycle_seconds: int = 1800
+    db_pool_pre_ping: bool = True
+    db_prepare_threshold: int | None = None
     llm_provider: str
     llm_chat_url: str
     llm_model: str
     llm_num_threads: int
     groq_api_key: str = ""
+    llm_http2: bool = True
+    llm_max_connections: int = 10
+    llm_max_keepalive_connections: int = 5
+    llm_keepalive_expiry_seconds: float = 30.0
+    llm_timeout_seconds: float = 300.0
+    llm_streaming: bool = True
+    llm_stream_max_chars: int = 50000
+    llm_cache_enabled: bool = True
+    llm_cache_ttl_hours: int = 168
+    llm_cache_max_entries: int = 5000
+    user_cache_max_entries: int = 10000
+    user_cache_ttl_seconds: int = 300
+    essay_detail_cache_max_entries: int = 1000
+    essay_detail_cache_ttl_seconds: int = 600
+    essay_status_max_wait_seconds: int = 30
+    essay_events_keepalive_seconds: int = 15
+    essay_worker_count: int = 4
+    file_worker_count: int = 2
+    upload_chunk_bytes: int = 1024 * 1024
+    pdf_max_upload_bytes: int = 20 * 1024 * 1024
+    pdf_process_count: int = 2
+    pdf_pages_per_task: int = 50
+    pdf_max_pages: int = 2000
+    pdf_extract_timeout_seconds: float = 60.0
+    ollama_max_concurrency: int = 1
+    groq_max_concurrency: int = 4
+    queue_claim_lease_seconds: int = 900
+    queue_lease_renew_seconds: int = 60
+    queue_poll_interval_seconds: int = 120
+    queue_completed_retention_hours: int = 24
+    queue_failed_retention_hours: int = 24 * 7
+    queue_archive_retention_months: int = 12
+    blob_compression_level: int = 10
+    expo_push_url: str = "https://exp.host/--/api/v2/push/send"
+    expo_receipts_url: str = "https://exp.host/--/api/v2/push/getReceipts"
+    push_batch_size: int = 100
+    push_max_retries: int = 4
+    push_retry_backoff_seconds: float = 1.0
+    push_timeout_seconds: float = 10.0
+    push_receipt_delay_seconds: int = 900
+    notification_outbox_poll_seconds: int = 10
+    notification_claim_seconds: int = 300
+    notification_max_attempts: int = 5
+    notification_retry_backoff_seconds: float = 30.0
+    notification_retention_hours: int = 24
+    metrics_token: str = ""
 
 
 settings = Settings()
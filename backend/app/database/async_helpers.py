@@ -0,0 +1,41 @@
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from .database import Base
+
+# These helpers only flush. The service that owns the request's session
+# commits once, so every write of one request shares a single transaction.
+
+
+async def single_entry_to_db[T: Base](
+    db: AsyncSession, model: type[T], data: dict
+) -> T:
+    entry = model(**data)
+    db.add(entry)
+    await db.flush()
+    await db.refresh(entry)
+    return entry
+
+
+async def update_by_id[T: Base](
+    db: AsyncSession, model: type[T], entry_id: int, data: dict
+) -> T | None:
+    entry = await db.scalar(select(model).where(model.id == entry_id))
+    if not entry:
+        return None
+    for key, value in data.items():
+        setattr(entry, key, value)
+    await db.flush()
+    await db.refresh(entry)
+    return entry
+
+
+async def delete_by_id[T: Base](
+    db: AsyncSession, model: type[T], entry_id: int
+) -> T | None:
+    entry = await db.scalar(select(model).where(model.id == entry_id))
+    if not entry:
+        return None
+    await db.delete(entry)
+    await db.flush()
+    return entry
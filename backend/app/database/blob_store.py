@@ -0,0 +1,150 @@
+import hashlib
+from collections import Counter
+from collections.abc import Iterable
+from typing import NamedTuple
+
+import zstandard
+from sqlalchemy import (
+    ColumnElement,
+    Connection,
+    ScalarSelect,
+    delete,
+    select,
+    update,
+)
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+
+from ..config import settings
+from .entities import ContentBlob
+
+# Texts are stored once per distinct content, zstd-compressed and keyed by
+# the SHA-256 of the uncompressed UTF-8 bytes. Rows point at a blob by hash,
+# and every stored reference counts towards the blob's ref_count, so a blob
+# is deleted when the last row that references it releases it.
+
+
+def content_hash(text: str) -> str:
+    return hashlib.sha256(text.encode()).hexdigest()
+
+
+def compress_text(text: str) -> bytes:
+    # Compressor objects are not thread-safe, so each call gets its own.
+    return zstandard.ZstdCompressor(level=settings.blob_compression_level).compress(
+        text.encode()
+    )
+
+
+def decompress_text(data: bytes | None) -> str | None:
+    if data is None:
+        return None
+    return zstandard.ZstdDecompressor().decompress(data).decode()
+
+
+class PreparedBlob(NamedTuple):
+    sha256: str
+    data: bytes
+    size: int
+
+
+def prepare_blob(text: str | None) -> PreparedBlob | None:
+    """
+    Hash and compress `text` for `store_blob`. This is the CPU-heavy part,
+    so async callers run it on a worker thread instead of the event loop.
+    """
+    if text is None:
+        return None
+    return PreparedBlob(content_hash(text), compress_text(text), len(text.encode()))
+
+
+def store_blob(db: Session, content: str | PreparedBlob | None) -> str | None:
+    """
+    Store a text, or a blob already prepared with `prepare_blob`, and
+    return its hash, or add a reference when the same text is already
+    stored. Flushes only; the caller commits.
+    """
+    blob = prepare_blob(content) if isinstance(content, str) else content
+    if blob is None:
+        return None
+    statement = insert(ContentBlob).values(
+        sha256=blob.sha256,
+        data=blob.data,
+        size=blob.size,
+        ref_count=1,
+    )
+    db.execute(
+        statement.on_conflict_do_update(
+            index_elements=[ContentBlob.sha256],
+            set_={"ref_count": ContentBlob.ref_count + 1},
+        )
+    )
+    return blob.sha256
+
+
+def release_blobs(
+    db: Session | Connection, hashes: Iterable[str | None] | Counter[str]
+) -> int:
+    """
+    Drop one reference per hash, or per counted hash when given a Counter,
+    and delete the blobs nobody references any more. Returns how many were
+    deleted.
+    """
+    counts = Counter(hashes)
+    counts.pop(None, None)
+    if not counts:
+        return 0
+    # Sorted, so concurrent releases lock blobs in the same order.
+    for sha256, count in sorted(counts.items()):
+        db.execute(
+            update(ContentBlob)
+            .where(ContentBlob.sha256 == sha256)
+            .values(ref_count=ContentBlob.ref_count - count)
+        )
+    return db.execute(
+        delete(ContentBlob).where(
+            ContentBlob.sha256.in_(counts), ContentBlob.ref_count <= 0
+        )
+    ).rowcount
+
+
+def retain_blobs(db: Session, hashes: Iterable[str | None]) -> None:
+    """Add one reference per hash to blobs that are already stored."""
+    counts = Counter(hashes)
+    counts.pop(None, None)
+    for sha256, count in sorted(counts.items()):
+        db.execute(
+            update(ContentBlob)
+            .where(ContentBlob.sha256 == sha256)
+            .values(ref_count=ContentBlob.ref_count + count)
+        )
+
+
+def replace_blob(
+    db: Session, old_hash: str | None, content: str | PreparedBlob | None
+) -> str | None:
+    # The new text is stored first, so rewriting a row with the text it
+    # already has never deletes the blob in between.
+    new_hash = store_blob(db, content)
+    release_blobs(db, [old_hash])
+    return new_hash
+
+
+def load_blob(db: Session, sha256: str | None) -> str | None:
+    if sha256 is None:
+        return None
+    return decompress_text(
+        db.scalar(select(ContentBlob.data).where(ContentBlob.sha256 == sha256))
+    )
+
+
+def blob_data(hash_column: ColumnElement[str | None]) -> ScalarSelect:
+    """
+    Correlated subquery selecting the compressed blob a hash column points
+    at, so a query can load it with the row. Decompress with
+    `decompress_text`.
+    """
+    return (
+        select(ContentBlob.data)
+        .where(ContentBlob.sha256 == hash_column)
+        .scalar_subquery()
+    )
@@ -1,10 +1,12 @@
-from collections.abc import Generator
+from collections.abc import AsyncGenerator, Generator
 from contextlib import contextmanager
 
 from sqlalchemy import URL, create_engine
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import DeclarativeBase, Session, sessionmaker
 
 from ..config import settings
+from .pool_metrics import TimedAsyncQueuePool, TimedQueuePool
 
 database_url = URL.create(
     drivername="postgresql+psycopg",
@@ -17,9 +19,33 @@ database_url = URL.create(
 )
 
 
-engine = create_engine(database_url, connect_args={"prepare_threshold": None})
+engine = create_engine(
+    database_url,
+    poolclass=TimedQueuePool,
+    pool_size=settings.db_job_pool_size,
+    max_overflow=settings.db_job_max_overflow,
+    pool_timeout=settings.db_pool_timeout_seconds,
+    pool_recycle=settings.db_pool_recycle_seconds,
+    pool_pre_ping=settings.db_pool_pre_ping,
+    connect_args={"prepare_threshold": settings.db_prepare_threshold},
+)
+
+SessionLocal = sessionmaker(bind=engine, autoflush=False, expire_on_commit=False)
+
+async_engine = create_async_engine(
+    database_url,
+    poolclass=TimedAsyncQueuePool,
+    pool_size=settings.db_pool_size,
+    max_overflow=settings.db_max_overflow,
+    pool_timeout=settings.db_pool_timeout_seconds,
+    pool_recycle=settings.db_pool_recycle_seconds,
+    pool_pre_ping=settings.db_pool_pre_ping,
+    connect_args={"prepare_threshold": settings.db_prepare_threshold},
+)
 
-SessionLocal = sessionmaker(bind=engine, autoflush=False)
+AsyncSessionLocal = async_sessionmaker(
+    bind=async_engine, autoflush=False, expire_on_commit=False
+)
 
 
 class Base(DeclarativeBase):
@@ -33,3 +59,23 @@ def get_db() -> Generator[Session, None, None]:
         yield db
     finally:
         db.close()
+
+
+@contextmanager
+def unit_of_work() -> Generator[Session, None, None]:
+    """
+    One session and one transaction for a whole job run: committed when the
+    block finishes, rolled back if it raises.
+    """
+    with get_db() as db:
+        try:
+            yield db
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+
+
+async def get_async_db() -> AsyncGenerator[AsyncSession, None]:
+    async with AsyncSessionLocal() as db:
+        yield db
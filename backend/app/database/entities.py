@@ -1,8 +1,9 @@
 import datetime
 from enum import StrEnum
 
-from sqlalchemy import DateTime, ForeignKey, func
+from sqlalchemy import DateTime, ForeignKey, Index, LargeBinary, String, func
 from sqlalchemy import Enum as SAEnum
+from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.orm import Mapped, mapped_column
 
 from .database import Base
@@ -22,6 +23,22 @@ class EssayProcessingStatus(StrEnum):
     ERROR = "error"
 
 
+ACTIVE_PROCESSING_STATUSES = [
+    EssayProcessingStatus.PENDING,
+    EssayProcessingStatus.PROCESSING,
+    EssayProcessingStatus.READY_FOR_FEEDBACK_EXTRACTION,
+    EssayProcessingStatus.FEEDBACK_EXTRACTION,
+    EssayProcessingStatus.ERROR,
+]
+
+
+class NotificationStatus(StrEnum):
+    PENDING = "pending"
+    SENT = "sent"
+    FAILED = "failed"
+    SKIPPED = "skipped"
+
+
 class AnalysisStatus(StrEnum):
     NEW = "new"
     PROCESSING = "processing"
@@ -68,7 +85,7 @@ class User(TimestampMixin, Base):
 
     id: Mapped[int] = mapped_column(primary_key=True)
     username: Mapped[str] = mapped_column(unique=True, index=True)
-    uuid: Mapped[str | None]
+    uuid: Mapped[str | None] = mapped_column(index=True)
     push_token: Mapped[str | None]
     target_cefr_level: Mapped[CefrLevel | None] = mapped_column(
         SAEnum(CefrLevel, name="cefrlevel", create_type=False), nullable=True
@@ -78,17 +95,55 @@ class User(TimestampMixin, Base):
         return f"<User(id={self.id}, username={self.username})>"
 
 
+class ContentBlob(Base):
+    __tablename__ = "content_blobs"
+
+    # SHA-256 of the uncompressed UTF-8 text; `data` is zstd-compressed.
+    sha256: Mapped[str] = mapped_column(String(64), primary_key=True)
+    data: Mapped[bytes] = mapped_column(LargeBinary)
+    size: Mapped[int]
+    ref_count: Mapped[int]
+    created_at: Mapped[datetime.datetime] = mapped_column(
+        DateTime(timezone=True), server_default=func.now()
+    )
+
+    def __repr__(self) -> str:
+        return f"<ContentBlob(sha256={self.sha256}, ref_count={self.ref_count})>"
+
+
 class Essay(TimestampMixin, Base):
     __tablename__ = "essays"
+    __table_args__ = (
+        Index("ix_essays_user_id_title", "user_id", "title"),
+        Index("ix_essays_user_id_id", "user_id", "id"),
+        # A user uploads each thread once, even when two uploads race.
+        Index(
+            "ix_essays_user_id_content_fingerprint",
+            "user_id",
+            "content_fingerprint",
+            unique=True,
+        ),
+    )
 
     id: Mapped[int] = mapped_column(primary_key=True)
     user_id: Mapped[int] = mapped_column(ForeignKey("users.id", ondelete="CASCADE"))
     title: Mapped[str] = mapped_column(index=True)
-    original_content: Mapped[str | None]
-    analyzed_content: Mapped[str | None]
+    original_content_sha256: Mapped[str | None] = mapped_column(
+        ForeignKey("content_blobs.sha256")
+    )
+    analyzed_content_sha256: Mapped[str | None] = mapped_column(
+        ForeignKey("content_blobs.sha256")
+    )
     cerf_level_grade: Mapped[CefrLevel | None] = mapped_column(
         SAEnum(CefrLevel, name="cefrlevel", create_type=False), nullable=True
     )
+    # The level the user was aiming for when the essay was uploaded, which
+    # its grade and feedback were written against.
+    target_cefr_level: Mapped[CefrLevel | None] = mapped_column(
+        SAEnum(CefrLevel, name="cefrlevel", create_type=False), nullable=True
+    )
+    # Normalized-text hash of the uploaded thread, see content_fingerprint.
+    content_fingerprint: Mapped[str | None] = mapped_column(String(64), index=True)
     document_path: Mapped[str | None]
 
     def __repr__(self) -> str:
@@ -100,7 +155,9 @@ class EssayAnalysis(TimestampMixin, Base):
 
     id: Mapped[int] = mapped_column(primary_key=True)
     user_id: Mapped[int] = mapped_column(ForeignKey("users.id", ondelete="CASCADE"))
-    essay_id: Mapped[int] = mapped_column(ForeignKey("essays.id", ondelete="CASCADE"))
+    essay_id: Mapped[int] = mapped_column(
+        ForeignKey("essays.id", ondelete="CASCADE"), index=True
+    )
     analysis_result: Mapped[str]
     confidence: Mapped[Confidence]
     recommendations: Mapped[str | None]
@@ -114,7 +171,9 @@ class FeedbackItem(TimestampMixin, Base):
 
     id: Mapped[int] = mapped_column(primary_key=True)
     user_id: Mapped[int] = mapped_column(ForeignKey("users.id", ondelete="CASCADE"))
-    essay_id: Mapped[int] = mapped_column(ForeignKey("essays.id", ondelete="CASCADE"))
+    essay_id: Mapped[int] = mapped_column(
+        ForeignKey("essays.id", ondelete="CASCADE"), index=True
+    )
     feedback_origin: Mapped[FeedbackOrigin]
     category: Mapped[AnalysisCategory]
     short_mistake_summary: Mapped[str]
@@ -133,15 +192,121 @@ class EssayProcessingQueue(TimestampMixin, Base):
     essay_id: Mapped[int | None] = mapped_column(
         ForeignKey("essays.id", ondelete="CASCADE")
     )
-    status: Mapped[EssayProcessingStatus]
+    status: Mapped[EssayProcessingStatus] = mapped_column(index=True)
     retries: Mapped[int] = mapped_column(default=0)
-    raw_content: Mapped[str]
+    raw_content_sha256: Mapped[str] = mapped_column(ForeignKey("content_blobs.sha256"))
     document_path: Mapped[str | None]
+    lease_owner: Mapped[str | None]
+    lease_expires_at: Mapped[datetime.datetime | None] = mapped_column(
+        DateTime(timezone=True)
+    )
+
+    __table_args__ = (
+        Index(
+            "ix_essay_processing_queue_essay_id_created_at", "essay_id", "created_at"
+        ),
+    )
 
     def __repr__(self) -> str:
         return f"<EssayProcessingQueue(id={self.id}, essay_id={self.essay_id}, status={self.status})>"
 
 
+# Only entries still moving through the pipeline, so the claim queries stay
+# fast however many completed entries pile up.
+Index(
+    "ix_essay_processing_queue_active",
+    EssayProcessingQueue.id,
+    postgresql_where=EssayProcessingQueue.status.in_(ACTIVE_PROCESSING_STATUSES),
+)
+
+
+class EssayProcessingArchive(Base):
+    """
+    Finished queue entries moved out of the hot queue table. Partitioned by
+    month of `created_at`, so retention drops whole partitions.
+    """
+
+    __tablename__ = "essay_processing_archive"
+    __table_args__ = (
+        Index(
+            "ix_essay_processing_archive_essay_id_created_at", "essay_id", "created_at"
+        ),
+        {"postgresql_partition_by": "RANGE (created_at)"},
+    )
+
+    # Keeps the id the entry had in the queue.
+    id: Mapped[int] = mapped_column(primary_key=True, autoincrement=False)
+    created_at: Mapped[datetime.datetime] = mapped_column(
+        DateTime(timezone=True), primary_key=True
+    )
+    updated_at: Mapped[datetime.datetime] = mapped_column(DateTime(timezone=True))
+    archived_at: Mapped[datetime.datetime] = mapped_column(
+        DateTime(timezone=True), server_default=func.now()
+    )
+    user_id: Mapped[int] = mapped_column(ForeignKey("users.id", ondelete="CASCADE"))
+    essay_id: Mapped[int | None] = mapped_column(
+        ForeignKey("essays.id", ondelete="CASCADE")
+    )
+    status: Mapped[EssayProcessingStatus]
+    retries: Mapped[int]
+    raw_content_sha256: Mapped[str] = mapped_column(ForeignKey("content_blobs.sha256"))
+    document_path: Mapped[str | None]
+
+    def __repr__(self) -> str:
+        return f"<EssayProcessingArchive(id={self.id}, essay_id={self.essay_id}, status={self.status})>"
+
+
+class NotificationOutbox(TimestampMixin, Base):
+    """
+    Push notifications waiting to be sent. Rows are written in the same
+    transaction as the change they announce and sent later by the outbox
+    drainer, which resolves the user's current push token.
+    """
+
+    __tablename__ = "notification_outbox"
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    user_id: Mapped[int] = mapped_column(ForeignKey("users.id", ondelete="CASCADE"))
+    title: Mapped[str]
+    body: Mapped[str]
+    data: Mapped[dict] = mapped_column(JSONB)
+    status: Mapped[NotificationStatus] = mapped_column(
+        default=NotificationStatus.PENDING
+    )
+    attempts: Mapped[int] = mapped_column(default=0)
+    next_attempt_at: Mapped[datetime.datetime] = mapped_column(
+        DateTime(timezone=True), server_default=func.now()
+    )
+    sent_at: Mapped[datetime.datetime | None] = mapped_column(DateTime(timezone=True))
+    last_error: Mapped[str | None]
+
+    def __repr__(self) -> str:
+        return f"<NotificationOutbox(id={self.id}, user_id={self.user_id}, status={self.status})>"
+
+
+Index(
+    "ix_notification_outbox_pending",
+    NotificationOutbox.next_attempt_at,
+    postgresql_where=NotificationOutbox.status == NotificationStatus.PENDING,
+)
+
+
+class LlmResponseCache(TimestampMixin, Base):
+    __tablename__ = "llm_response_cache"
+
+    prompt_hash: Mapped[str] = mapped_column(primary_key=True)
+    provider: Mapped[str]
+    model: Mapped[str]
+    response: Mapped[str]
+    hits: Mapped[int] = mapped_column(default=0)
+    last_accessed_at: Mapped[datetime.datetime] = mapped_column(
+        DateTime(timezone=True), server_default=func.now(), index=True
+    )
+
+    def __repr__(self) -> str:
+        return f"<LlmResponseCache(prompt_hash={self.prompt_hash}, model={self.model})>"
+
+
 class WriteEssayDraft(TimestampMixin, Base):
     __tablename__ = "write_essay_drafts"
 
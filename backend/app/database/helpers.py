@@ -1,72 +1,248 @@
+from collections.abc import Generator
+from contextlib import contextmanager
+from datetime import timedelta
+from typing import NamedTuple
+
+from sqlalchemy import (
+    ColumnElement,
+    Row,
+    Update,
+    and_,
+    func,
+    insert,
+    or_,
+    select,
+    update,
+)
 from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import Session
 
-from .database import Base, get_db
+from .database import Base, get_db, unit_of_work
 
 
-def single_entry_to_db[T: Base](model: type[T], data: dict) -> T:
-    with get_db() as db:
-        try:
-            entry = model(**data)
-            db.add(entry)
-            db.commit()
-            db.refresh(entry)
-            return entry
-        except SQLAlchemyError:
-            db.rollback()
-            raise
+@contextmanager
+def _session_scope(db: Session | None) -> Generator[Session, None, None]:
+    if db is not None:
+        yield db
+        return
+    with unit_of_work() as own_db:
+        yield own_db
 
 
-def bulk_entries_to_db[T: Base](model: type[T], data: list[dict]) -> list[T]:
-    with get_db() as db:
-        try:
-            entries = [model(**item) for item in data]
-            db.add_all(entries)
-            db.commit()
-            for entry in entries:
-                db.refresh(entry)
-            return entries
-        except SQLAlchemyError:
-            db.rollback()
-            raise
+def single_entry_to_db[T: Base](
+    model: type[T], data: dict, db: Session | None = None
+) -> T:
+    """
+    Without `db` the entry is committed in its own transaction. With `db`
+    it is only flushed, and the caller's unit of work commits it.
+    """
+    with _session_scope(db) as session:
+        entry = model(**data)
+        session.add(entry)
+        session.flush()
+        session.refresh(entry)
+        return entry
+
+
+def bulk_entries_to_db[T: Base](
+    model: type[T],
+    data: list[dict],
+    db: Session | None = None,
+    returning: tuple[ColumnElement, ...] = (),
+) -> list[Row]:
+    """
+    Insert every row with one multi-row INSERT ... RETURNING, skipping the
+    ORM unit of work. Returns plain rows of the `returning` columns (the
+    primary key by default) in the order of `data`; no objects are loaded
+    or refreshed. Rows must all have the same keys.
+    """
+    if not data:
+        return []
+    with _session_scope(db) as session:
+        return list(
+            session.execute(
+                insert(model).returning(
+                    *(returning or model.__table__.primary_key.columns),
+                    sort_by_parameter_order=True,
+                ),
+                data,
+            ).all()
+        )
 
 
 def get_ids_by_status[T: Base](
-    model: type[T], status_field: str, status_value: str
+    model: type[T], status_field: str, status_value: str, db: Session | None = None
 ) -> list[int]:
-    with get_db() as db:
+    with _session_scope(db) as session:
         entries = (
-            db.query(model.id)
+            session.query(model.id)
             .filter(getattr(model, status_field) == status_value)
             .all()
         )
         return [entry.id for entry in entries]
 
 
-def update_by_id[T: Base](model: type[T], entry_id: int, data: dict) -> T | None:
+class LeaseClaim(NamedTuple):
+    entry_id: int
+    # Unique to this claim, so a row claimed again, even by the same
+    # process, never passes for the earlier claim.
+    lease_owner: str
+
+
+def build_claim_statement[T: Base](
+    model: type[T],
+    status_field: str,
+    claimable_statuses: list[str],
+    claimed_status: str,
+    limit: int,
+    lease_owner: str,
+    lease_seconds: int,
+    *conditions: ColumnElement[bool],
+) -> Update:
+    status_column = getattr(model, status_field)
+    claimable = (
+        select(model.id)
+        .where(
+            # Redundant with the OR below, but lets Postgres match partial
+            # indexes on the status column.
+            status_column.in_([*claimable_statuses, claimed_status]),
+            or_(
+                status_column.in_(claimable_statuses),
+                and_(
+                    status_column == claimed_status,
+                    model.lease_expires_at < func.now(),
+                ),
+            ),
+            *conditions,
+        )
+        .order_by(model.id)
+        .limit(limit)
+        .with_for_update(skip_locked=True)
+        .cte("claimable")
+    )
+    return (
+        update(model)
+        .where(model.id.in_(select(claimable.c.id)))
+        .values(
+            {
+                status_field: claimed_status,
+                "lease_owner": func.concat(lease_owner, ":", func.gen_random_uuid()),
+                "lease_expires_at": func.now() + timedelta(seconds=lease_seconds),
+            }
+        )
+        .returning(model.id, model.lease_owner)
+    )
+
+
+def claim_by_status[T: Base](
+    model: type[T],
+    status_field: str,
+    claimable_statuses: list[str],
+    claimed_status: str,
+    limit: int,
+    lease_owner: str,
+    lease_seconds: int,
+    *conditions: ColumnElement[bool],
+) -> list[LeaseClaim]:
+    """
+    Atomically claim up to `limit` rows in one of `claimable_statuses`, or
+    rows left in `claimed_status` by a worker whose lease has expired.
+    Rows locked by another transaction are skipped, so concurrent workers
+    on any node never claim the same row twice. Each claimed row is leased
+    to `lease_owner` plus a random suffix, returned with its id.
+    """
+    if limit <= 0:
+        return []
+
     with get_db() as db:
         try:
-            entry = db.query(model).filter(model.id == entry_id).first()
-            if not entry:
-                return None
-            for key, value in data.items():
-                setattr(entry, key, value)
+            claimed = db.execute(
+                build_claim_statement(
+                    model,
+                    status_field,
+                    claimable_statuses,
+                    claimed_status,
+                    limit,
+                    lease_owner,
+                    lease_seconds,
+                    *conditions,
+                )
+            ).all()
             db.commit()
-            db.refresh(entry)
-            return entry
+            return [LeaseClaim(*row) for row in claimed]
         except SQLAlchemyError:
             db.rollback()
             raise
 
 
-def delete_by_id[T: Base](model: type[T], entry_id: int) -> T | None:
+class LeaseLostError(Exception):
+    pass
+
+
+def renew_leases[T: Base](
+    model: type[T], lease_owners: list[str], lease_seconds: int
+) -> list[int]:
+    """
+    Push forward the leases of the rows still held by one of
+    `lease_owners`. Returns the ids that were renewed.
+    """
+    if not lease_owners:
+        return []
+
     with get_db() as db:
-        try:
-            entry = db.query(model).filter(model.id == entry_id).first()
-            if not entry:
-                return None
-            db.delete(entry)
-            db.commit()
-            return entry
-        except SQLAlchemyError:
-            db.rollback()
-            raise
+        renewed_ids = db.scalars(
+            update(model)
+            .where(model.lease_owner.in_(lease_owners))
+            .values(lease_expires_at=func.now() + timedelta(seconds=lease_seconds))
+            .returning(model.id)
+        ).all()
+        db.commit()
+        return list(renewed_ids)
+
+
+def ensure_lease_held[T: Base](
+    db: Session, model: type[T], entry_id: int, lease_owner: str
+) -> None:
+    """
+    Lock the row and raise LeaseLostError unless `lease_owner` still holds
+    it. Call it right before committing a worker's results; the lock keeps
+    the row from being claimed by anyone else until that commit.
+    """
+    current_owner = db.scalar(
+        select(model.lease_owner).where(model.id == entry_id).with_for_update()
+    )
+    if current_owner != lease_owner:
+        raise LeaseLostError(
+            f"{model.__name__} {entry_id} is now leased by {current_owner}"
+        )
+
+
+def release_lease(entry: Base) -> None:
+    entry.lease_owner = None
+    entry.lease_expires_at = None
+
+
+def update_by_id[T: Base](
+    model: type[T], entry_id: int, data: dict, db: Session | None = None
+) -> T | None:
+    with _session_scope(db) as session:
+        entry = session.query(model).filter(model.id == entry_id).first()
+        if not entry:
+            return None
+        for key, value in data.items():
+            setattr(entry, key, value)
+        session.flush()
+        session.refresh(entry)
+        return entry
+
+
+def delete_by_id[T: Base](
+    model: type[T], entry_id: int, db: Session | None = None
+) -> T | None:
+    with _session_scope(db) as session:
+        entry = session.query(model).filter(model.id == entry_id).first()
+        if not entry:
+            return None
+        session.delete(entry)
+        session.flush()
+        return entry
@@ -0,0 +1,152 @@
+"""
+One-off migration of essay and queue texts into the content blob store.
+
+Run it from `backend/` with the backend stopped, before starting a version
+that reads texts from `content_blobs`:
+
+    python -m app.database.migrate_content_blobs
+
+Every distinct text is stored once as a compressed blob whose ref_count is
+the number of rows holding it, each row gets the hash of its text, and the
+old text column is dropped. All of it runs in one transaction, and columns
+that are already migrated are skipped, so a failed run can simply be
+repeated.
+"""
+
+import logging
+
+from sqlalchemy import Connection, column, func, inspect, select, table, text, update
+from sqlalchemy.dialects.postgresql import insert
+
+from .blob_store import compress_text, content_hash
+from .database import engine
+from .entities import ContentBlob
+
+logging.basicConfig(
+    level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s"
+)
+
+BATCH_SIZE = 500
+# (table, old text column, new hash column, whether every row has a text)
+MIGRATED_COLUMNS = [
+    ("essays", "original_content", "original_content_sha256", False),
+    ("essays", "analyzed_content", "analyzed_content_sha256", False),
+    ("essay_processing_queue", "raw_content", "raw_content_sha256", True),
+    ("essay_processing_archive", "raw_content", "raw_content_sha256", True),
+]
+
+
+def _column_names(conn: Connection, table_name: str) -> set[str]:
+    inspector = inspect(conn)
+    if not inspector.has_table(table_name):
+        return set()
+    return {column["name"] for column in inspector.get_columns(table_name)}
+
+
+def _has_foreign_key(conn: Connection, table_name: str, column_name: str) -> bool:
+    return any(
+        foreign_key["constrained_columns"] == [column_name]
+        for foreign_key in inspect(conn).get_foreign_keys(table_name)
+    )
+
+
+def _store_blobs(
+    conn: Connection, table_name: str, text_column: str, hash_column: str
+) -> int:
+    """
+    Store each distinct text not hashed yet, adding one reference per row
+    that holds it. Returns how many rows were counted.
+    """
+    source = table(table_name, column(text_column), column(hash_column))
+    texts = conn.execute(
+        select(source.c[text_column], func.count())
+        .where(source.c[text_column].is_not(None), source.c[hash_column].is_(None))
+        .group_by(source.c[text_column])
+        .execution_options(yield_per=BATCH_SIZE)
+    )
+    counted = 0
+    for batch in texts.partitions():
+        statement = insert(ContentBlob).values(
+            [
+                {
+                    "sha256": content_hash(content),
+                    "data": compress_text(content),
+                    "size": len(content.encode()),
+                    "ref_count": count,
+                }
+                for content, count in batch
+            ]
+        )
+        conn.execute(
+            statement.on_conflict_do_update(
+                index_elements=[ContentBlob.sha256],
+                set_={
+                    "ref_count": ContentBlob.ref_count + statement.excluded.ref_count
+                },
+            )
+        )
+        counted += sum(count for _, count in batch)
+    return counted
+
+
+def _migrate_column(
+    conn: Connection,
+    table_name: str,
+    text_column: str,
+    hash_column: str,
+    required: bool,
+) -> None:
+    if text_column not in _column_names(conn, table_name):
+        return
+
+    # Names below only come from MIGRATED_COLUMNS.
+    conn.execute(
+        text(
+            f"ALTER TABLE {table_name} "
+            f"ADD COLUMN IF NOT EXISTS {hash_column} VARCHAR(64)"
+        )
+    )
+    counted = _store_blobs(conn, table_name, text_column, hash_column)
+
+    # Hashed in the database, so no text is sent back. Both sides hash the
+    # UTF-8 bytes, and the foreign key below fails the migration should a
+    # hash ever miss its blob.
+    source = table(table_name, column(text_column), column(hash_column))
+    conn.execute(
+        update(source)
+        .where(source.c[text_column].is_not(None), source.c[hash_column].is_(None))
+        .values(
+            {
+                hash_column: func.encode(
+                    func.sha256(func.convert_to(source.c[text_column], "UTF8")),
+                    "hex",
+                )
+            }
+        )
+    )
+    if not _has_foreign_key(conn, table_name, hash_column):
+        conn.execute(
+            text(
+                f"ALTER TABLE {table_name} ADD FOREIGN KEY ({hash_column}) "
+                f"REFERENCES {ContentBlob.__tablename__} (sha256)"
+            )
+        )
+    if required:
+        conn.execute(
+            text(f"ALTER TABLE {table_name} ALTER COLUMN {hash_column} SET NOT NULL")
+        )
+    conn.execute(text(f"ALTER TABLE {table_name} DROP COLUMN {text_column}"))
+    logging.info(
+        f"Moved {counted} texts of {table_name}.{text_column} to content blobs."
+    )
+
+
+def migrate_content_blobs() -> None:
+    with engine.begin() as conn:
+        ContentBlob.__table__.create(conn, checkfirst=True)
+        for table_name, text_column, hash_column, required in MIGRATED_COLUMNS:
+            _migrate_column(conn, table_name, text_column, hash_column, required)
+
+
+if __name__ == "__main__":
+    migrate_content_blobs()
@@ -0,0 +1,87 @@
+import datetime
+import re
+from collections import Counter
+
+from sqlalchemy import Connection, func, select, text
+from sqlalchemy.orm import Session
+
+from .blob_store import release_blobs
+from .entities import EssayProcessingArchive
+
+ARCHIVE_TABLE = EssayProcessingArchive.__tablename__
+PARTITION_NAME = re.compile(rf"^{ARCHIVE_TABLE}_y(\d{{4}})m(\d{{2}})$")
+# Serialises partition DDL between replicas.
+PARTITION_LOCK_ID = 0x6573_7361_7961_7263
+
+
+def month_start(value: datetime.datetime | datetime.date) -> datetime.date:
+    if isinstance(value, datetime.datetime):
+        value = value.astimezone(datetime.UTC)
+    return datetime.date(value.year, value.month, 1)
+
+
+def next_month(month: datetime.date) -> datetime.date:
+    return datetime.date(month.year + month.month // 12, month.month % 12 + 1, 1)
+
+
+def _partition_name(month: datetime.date) -> str:
+    return f"{ARCHIVE_TABLE}_y{month.year:04d}m{month.month:02d}"
+
+
+def ensure_archive_partitions(
+    db: Session | Connection,
+    first: datetime.datetime | datetime.date,
+    last: datetime.datetime | datetime.date,
+) -> None:
+    """
+    Create the monthly archive partitions covering `first` to `last`.
+    Months are UTC calendar months.
+    """
+    db.execute(select(func.pg_advisory_xact_lock(PARTITION_LOCK_ID)))
+    month, last = month_start(first), month_start(last)
+    while month <= last:
+        upper = next_month(month)
+        db.execute(
+            text(
+                f"CREATE TABLE IF NOT EXISTS {_partition_name(month)} "
+                f"PARTITION OF {ARCHIVE_TABLE} "
+                f"FOR VALUES FROM ('{month.isoformat()} 00:00+00') "
+                f"TO ('{upper.isoformat()} 00:00+00')"
+            )
+        )
+        month = upper
+
+
+def list_archive_partitions(db: Session | Connection) -> dict[datetime.date, str]:
+    names = db.scalars(
+        text(
+            "SELECT child.relname FROM pg_inherits "
+            "JOIN pg_class child ON child.oid = pg_inherits.inhrelid "
+            "WHERE pg_inherits.inhparent = CAST(:parent AS regclass)"
+        ),
+        {"parent": ARCHIVE_TABLE},
+    ).all()
+    partitions = {}
+    for name in names:
+        if match := PARTITION_NAME.match(name):
+            partitions[datetime.date(int(match[1]), int(match[2]), 1)] = name
+    return partitions
+
+
+def drop_archive_partition(db: Session | Connection, name: str) -> None:
+    """
+    Drop an archive partition and release the content blobs its rows
+    reference.
+    """
+    db.execute(select(func.pg_advisory_xact_lock(PARTITION_LOCK_ID)))
+    # Only names read back from the catalog are interpolated below.
+    if name not in list_archive_partitions(db).values():
+        return
+    content_hashes = db.execute(
+        text(
+            f"SELECT raw_content_sha256, count(*) FROM {name} "  # noqa: S608
+            "GROUP BY raw_content_sha256"
+        )
+    ).all()
+    db.execute(text(f"DROP TABLE {name}"))
+    release_blobs(db, Counter(dict(content_hashes)))
@@ -0,0 +1,87 @@
+import threading
+import time
+from dataclasses import dataclass
+
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+
+
+@dataclass
+class PoolWaitTimings:
+    checkouts: int = 0
+    timeouts: int = 0
+    total_wait_seconds: float = 0.0
+    max_wait_seconds: float = 0.0
+
+
+_timings_lock = threading.Lock()
+_timings: dict[str, PoolWaitTimings] = {}
+_pools: dict[str, QueuePool] = {}
+
+
+def _record_checkout(name: str, wait_seconds: float, timed_out: bool) -> None:
+    with _timings_lock:
+        timings = _timings.setdefault(name, PoolWaitTimings())
+        timings.checkouts += 1
+        timings.timeouts += int(timed_out)
+        timings.total_wait_seconds += wait_seconds
+        timings.max_wait_seconds = max(timings.max_wait_seconds, wait_seconds)
+
+
+class _TimedPoolMixin:
+    """
+    Measures how long each checkout waits for a free connection. The pool
+    registers itself under `metrics_name` so the latest instance is the one
+    reported after a dispose or recreate.
+    """
+
+    metrics_name: str
+
+    def __init__(self, *args, max_overflow: int = 10, **kwargs):
+        self.configured_max_overflow = max_overflow
+        super().__init__(*args, max_overflow=max_overflow, **kwargs)
+
+    def _do_get(self):
+        _pools[self.metrics_name] = self
+        started_at = time.perf_counter()
+        timed_out = False
+        try:
+            return super()._do_get()
+        except PoolTimeoutError:
+            timed_out = True
+            raise
+        finally:
+            _record_checkout(
+                self.metrics_name, time.perf_counter() - started_at, timed_out
+            )
+
+
+class TimedQueuePool(_TimedPoolMixin, QueuePool):
+    metrics_name = "jobs"
+
+
+class TimedAsyncQueuePool(_TimedPoolMixin, AsyncAdaptedQueuePool):
+    metrics_name = "api"
+
+
+def get_pool_stats() -> dict[str, dict[str, float]]:
+    with _timings_lock:
+        timings = {name: PoolWaitTimings(**vars(t)) for name, t in _timings.items()}
+
+    stats = {}
+    for name, pool in _pools.items():
+        pool_timings = timings.get(name, PoolWaitTimings())
+        stats[name] = {
+            "size": pool.size(),
+            "checked_out": pool.checkedout(),
+            "checked_in": pool.checkedin(),
+            "overflow": max(pool.overflow(), 0),
+            "max_overflow": pool.configured_max_overflow,
+            "checkouts": pool_timings.checkouts,
+            "timeouts": pool_timings.timeouts,
+            "avg_wait_ms": 1000
+            * pool_timings.total_wait_seconds
+            / max(pool_timings.checkouts, 1),
+            "max_wait_ms": 1000 * pool_timings.max_wait_seconds,
+        }
+    return stats
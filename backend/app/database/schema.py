@@ -0,0 +1,32 @@
+from sqlalchemy import Column, Engine, inspect, text
+
+from .entities import Essay, EssayProcessingQueue
+
+# Columns added to tables that existing databases already have. create_all
+# only creates missing tables, so these are added on startup. Each must be
+# nullable and without a server default, so adding it is instant.
+ADDED_COLUMNS: list[Column] = [
+    Essay.__table__.c.target_cefr_level,
+    Essay.__table__.c.content_fingerprint,
+    EssayProcessingQueue.__table__.c.lease_owner,
+    EssayProcessingQueue.__table__.c.lease_expires_at,
+]
+
+
+def add_missing_columns(engine: Engine) -> None:
+    with engine.begin() as conn:
+        inspector = inspect(conn)
+        existing = {
+            table_name: {column["name"] for column in inspector.get_columns(table_name)}
+            for table_name in {column.table.name for column in ADDED_COLUMNS}
+        }
+        for column in ADDED_COLUMNS:
+            if column.name in existing[column.table.name]:
+                continue
+            # Names and types only come from the mapped columns above.
+            conn.execute(
+                text(
+                    f"ALTER TABLE {column.table.name} ADD COLUMN IF NOT EXISTS "
+                    f"{column.name} {column.type.compile(dialect=conn.dialect)}"
+                )
+            )
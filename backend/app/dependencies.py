@@ -1,7 +1,11 @@
+import secrets
+
 from fastapi import Depends, Header, HTTPException, status
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from .database.entities import User
-from .services.user_services import get_user_by_uuid
+from .config import settings
+from .database.database import get_async_db
+from .services.user_services import UserSnapshot, get_user_snapshot
 
 
 def get_uuid_header(x_user_uuid: str = Header()) -> str:
@@ -13,11 +17,28 @@ def get_uuid_header(x_user_uuid: str = Header()) -> str:
     return x_user_uuid
 
 
-def get_current_user(uuid: str = Depends(get_uuid_header)) -> User:
-    user = get_user_by_uuid(uuid)
+async def get_current_user(
+    uuid: str = Depends(get_uuid_header),
+    db: AsyncSession = Depends(get_async_db),
+) -> UserSnapshot:
+    user = await get_user_snapshot(db, uuid)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="User not found",
         )
     return user
+
+
+def require_metrics_token(x_metrics_token: str = Header("")) -> None:
+    """
+    Operational endpoints are only open to callers presenting the configured
+    METRICS_TOKEN; they stay closed while none is configured.
+    """
+    if not settings.metrics_token or not secrets.compare_digest(
+        x_metrics_token.encode(), settings.metrics_token.encode()
+    ):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="A valid X-Metrics-Token header is required",
+        )
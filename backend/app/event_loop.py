@@ -0,0 +1,63 @@
+import asyncio
+import threading
+from collections.abc import Coroutine
+from concurrent.futures import Future
+from contextlib import suppress
+
+SHUTDOWN_TIMEOUT_SECONDS = 5
+
+_loop: asyncio.AbstractEventLoop | None = None
+_thread: threading.Thread | None = None
+_lock = threading.Lock()
+
+
+def get_event_loop() -> asyncio.AbstractEventLoop:
+    """
+    Return the long-lived event loop shared by the background jobs, starting
+    it on a daemon thread the first time it is needed.
+    """
+    global _loop, _thread  # noqa: PLW0603
+    with _lock:
+        if _loop is None:
+            _loop = asyncio.new_event_loop()
+            _thread = threading.Thread(
+                target=_loop.run_forever, name="event-loop", daemon=True
+            )
+            _thread.start()
+        return _loop
+
+
+def submit[T](coro: Coroutine[object, object, T]) -> Future[T]:
+    return asyncio.run_coroutine_threadsafe(coro, get_event_loop())
+
+
+def run_sync[T](coro: Coroutine[object, object, T]) -> T:
+    return submit(coro).result()
+
+
+async def _cancel_pending_tasks() -> None:
+    tasks = [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+
+def stop_event_loop() -> None:
+    """
+    Cancel whatever is still running on the loop, so threads blocked in
+    `run_sync` get an error instead of waiting forever, then stop it.
+    """
+    global _loop, _thread  # noqa: PLW0603
+    with _lock:
+        if _loop is None:
+            return
+        with suppress(Exception):
+            asyncio.run_coroutine_threadsafe(_cancel_pending_tasks(), _loop).result(
+                timeout=SHUTDOWN_TIMEOUT_SECONDS
+            )
+        _loop.call_soon_threadsafe(_loop.stop)
+        if _thread:
+            _thread.join()
+        _loop.close()
+        _loop = None
+        _thread = None
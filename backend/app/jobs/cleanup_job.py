@@ -1,46 +1,181 @@
 import logging
-from datetime import UTC, datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor
+from datetime import UTC, date, datetime, timedelta
 
+from sqlalchemy import ColumnElement, Insert, and_, delete, func, insert, or_, select
+
+from ..config import settings
 from ..database.database import get_db
-from ..database.entities import EssayProcessingQueue, EssayProcessingStatus
+from ..database.entities import (
+    EssayProcessingArchive,
+    EssayProcessingQueue,
+    EssayProcessingStatus,
+    NotificationOutbox,
+    NotificationStatus,
+)
+from ..database.partitions import (
+    drop_archive_partition,
+    ensure_archive_partitions,
+    list_archive_partitions,
+)
 from ..services.helpers.files_services import remove_file
+from .essay_builder import MAXIMUM_RETRIES
 
 logging.basicConfig(
     level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s"
 )
 
-COMPLETED_RETENTION_HOURS = 24
+ARCHIVE_CHUNK_SIZE = 500
+FILE_REMOVAL_WORKERS = 8
+ARCHIVED_COLUMNS = [
+    "id",
+    "created_at",
+    "updated_at",
+    "user_id",
+    "essay_id",
+    "status",
+    "retries",
+    "raw_content_sha256",
+    "document_path",
+]
+
 
+def _finished_entries(now: datetime) -> ColumnElement[bool]:
+    # Failed entries are kept longer so they can still be looked into.
+    return or_(
+        and_(
+            EssayProcessingQueue.status == EssayProcessingStatus.COMPLETED,
+            EssayProcessingQueue.updated_at
+            < now - timedelta(hours=settings.queue_completed_retention_hours),
+        ),
+        and_(
+            EssayProcessingQueue.status == EssayProcessingStatus.ERROR,
+            EssayProcessingQueue.retries >= MAXIMUM_RETRIES,
+            EssayProcessingQueue.updated_at
+            < now - timedelta(hours=settings.queue_failed_retention_hours),
+        ),
+    )
+
+
+def _archive_statement(now: datetime, limit: int) -> Insert:
+    finished = (
+        select(EssayProcessingQueue.id)
+        .where(_finished_entries(now))
+        .order_by(EssayProcessingQueue.id)
+        .limit(limit)
+        .with_for_update(skip_locked=True)
+        .cte("finished")
+    )
+    moved = (
+        delete(EssayProcessingQueue)
+        .where(EssayProcessingQueue.id.in_(select(finished.c.id)))
+        .returning(*(getattr(EssayProcessingQueue, name) for name in ARCHIVED_COLUMNS))
+        .cte("moved")
+    )
+    return (
+        insert(EssayProcessingArchive)
+        .from_select(
+            ARCHIVED_COLUMNS, select(*(moved.c[name] for name in ARCHIVED_COLUMNS))
+        )
+        .returning(EssayProcessingArchive.document_path)
+    )
 
-def cleanup_completed_queue_entries():
-    cutoff = datetime.now(UTC) - timedelta(hours=COMPLETED_RETENTION_HOURS)
 
+def _prepare_archive(now: datetime) -> bool:
     with get_db() as db:
-        entries = (
-            db.query(EssayProcessingQueue)
-            .filter(
-                EssayProcessingQueue.status == EssayProcessingStatus.COMPLETED,
-                EssayProcessingQueue.updated_at < cutoff,
+        oldest = db.scalar(
+            select(func.min(EssayProcessingQueue.created_at)).where(
+                _finished_entries(now)
             )
-            .all()
         )
+        if oldest is None:
+            return False
+        ensure_archive_partitions(db, oldest, now)
+        db.commit()
+        return True
 
-        if not entries:
-            return
 
-        logging.info(
-            f"Cleaning up {len(entries)} completed queue entries older than {COMPLETED_RETENTION_HOURS}h."
-        )
+def _archive_chunk(now: datetime, limit: int) -> list[str | None]:
+    with get_db() as db:
+        document_paths = db.scalars(_archive_statement(now, limit)).all()
+        db.commit()
+        return list(document_paths)
+
+
+def _remove_document(document_path: str) -> bool:
+    try:
+        remove_file(document_path)
+    except OSError as e:
+        logging.error(f"Failed to remove PDF {document_path}: {e}")
+        return False
+    return True
 
-        for entry in entries:
-            if entry.document_path:
-                remove_file(entry.document_path)
-                logging.info(
-                    f"Removed PDF for queue entry {entry.id}: {entry.document_path}"
-                )
-            db.delete(entry)
 
+def archive_finished_queue_entries():
+    """
+    Move completed entries after `queue_completed_retention_hours`, and
+    entries that ran out of retries after `queue_failed_retention_hours`,
+    from the hot queue to the archive.
+    Each chunk is moved in one short transaction and its PDFs are removed
+    in parallel after it commits. An interrupted run leaves the remaining
+    rows for the next one.
+    """
+    now = datetime.now(UTC)
+    if not _prepare_archive(now):
+        return
+
+    archived_rows = removed_files = 0
+    with ThreadPoolExecutor(
+        max_workers=FILE_REMOVAL_WORKERS, thread_name_prefix="cleanup"
+    ) as pool:
+        while True:
+            document_paths = _archive_chunk(now, ARCHIVE_CHUNK_SIZE)
+            archived_rows += len(document_paths)
+            removed_files += sum(
+                pool.map(_remove_document, filter(None, document_paths))
+            )
+            if len(document_paths) < ARCHIVE_CHUNK_SIZE:
+                break
+
+    logging.info(
+        f"Archived {archived_rows} finished queue entries and removed {removed_files} PDFs."
+    )
+
+
+def drop_expired_archive_partitions():
+    """
+    Drop archive partitions whose whole month is older than
+    `queue_archive_retention_months`.
+    """
+    now = datetime.now(UTC)
+    months = now.year * 12 + now.month - 1 - settings.queue_archive_retention_months
+    oldest_kept = date(months // 12, months % 12 + 1, 1)
+
+    with get_db() as db:
+        expired = [
+            name
+            for month, name in sorted(list_archive_partitions(db).items())
+            if month < oldest_kept
+        ]
+        for name in expired:
+            drop_archive_partition(db, name)
         db.commit()
-        logging.info(
-            f"Cleanup of completed queue entries finished. Removed {len(entries)} rows."
+    for name in expired:
+        logging.info(f"Dropped expired archive partition {name}.")
+
+
+def cleanup_notification_outbox():
+    cutoff = datetime.now(UTC) - timedelta(hours=settings.notification_retention_hours)
+
+    with get_db() as db:
+        removed = (
+            db.query(NotificationOutbox)
+            .filter(
+                NotificationOutbox.status != NotificationStatus.PENDING,
+                NotificationOutbox.updated_at < cutoff,
+            )
+            .delete()
         )
+        db.commit()
+        if removed:
+            logging.info(f"Removed {removed} finished notification outbox rows.")
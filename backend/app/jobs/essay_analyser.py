@@ -1,6 +1,9 @@
-import asyncio
 import logging
 
+from sqlalchemy.orm import Session
+
+from ..config import settings
+from ..database.blob_store import load_blob
 from ..database.database import get_db
 from ..database.entities import (
     Essay,
@@ -8,15 +11,23 @@ from ..database.entities import (
     EssayProcessingStatus,
     FeedbackItem,
     FeedbackOrigin,
-    User,
 )
-from ..database.helpers import bulk_entries_to_db, get_ids_by_status
-from ..llm.llm_helper import chat_with_model, extract_json_from_response
+from ..database.helpers import (
+    LeaseClaim,
+    LeaseLostError,
+    bulk_entries_to_db,
+    claim_by_status,
+    release_lease,
+)
+from ..event_loop import run_sync
+from ..llm.llm_helper import ask_model
 from ..llm.prompts.essay_feedback_items_extractor import (
     get_essay_feedback_items_extraction_prompt,
 )
 from ..llm.schemas import FeedbackItemResponse
-from ..services.notification_service import send_push_notification
+from ..services.notification_service import enqueue_push_notification
+from ..services.queue_events import ProcessingStage, publish_queue_event
+from .worker_pool import LEASE_OWNER, ensure_essay_lease, essay_pool
 
 logging.basicConfig(
     level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s"
@@ -25,111 +36,132 @@ logging.basicConfig(
 MAXIMUM_RETRIES = 2
 
 
-def process_single_essay_for_feedback(entry_id: int):
+def save_feedback_items(
+    user_id: int,
+    essay_id: int,
+    feedback: FeedbackItemResponse,
+    db: Session | None = None,
+) -> None:
+    bulk_entries_to_db(
+        FeedbackItem,
+        [
+            {
+                "user_id": user_id,
+                "essay_id": essay_id,
+                "feedback_origin": FeedbackOrigin.TEACHER,
+                "category": item.category,
+                "short_mistake_summary": item.short_mistake_summary,
+                "comments": item.comments,
+            }
+            for item in feedback.feedback_items
+        ],
+        db,
+    )
+
+
+def _drop_results(db: Session, entry_id: int, error: LeaseLostError) -> None:
+    db.rollback()
+    logging.warning(
+        f"Dropped the feedback for essay queue entry {entry_id}, its lease was lost: {error}"
+    )
+
+
+def _fail_entry(db: Session, entry: EssayProcessingQueue, lease_owner: str) -> None:
+    try:
+        ensure_essay_lease(db, entry, lease_owner)
+    except LeaseLostError as e:
+        _drop_results(db, entry.id, e)
+        return
+    entry.status = EssayProcessingStatus.ERROR
+    entry.retries += 1
+    release_lease(entry)
+    enqueue_push_notification(
+        db,
+        entry.user_id,
+        title="Essay Error",
+        body="There was a problem processing your essay.",
+        data={"essay_id": entry.essay_id},
+    )
+    publish_queue_event(db, entry)
+    db.commit()
+
+
+def process_single_essay_for_feedback(entry_id: int, lease_owner: str):
     with get_db() as db:
         entry = (
             db.query(EssayProcessingQueue)
-            .filter(
-                EssayProcessingQueue.id == entry_id,
-                EssayProcessingQueue.status
-                == EssayProcessingStatus.READY_FOR_FEEDBACK_EXTRACTION,
-                EssayProcessingQueue.retries < MAXIMUM_RETRIES,
-            )
+            .filter(EssayProcessingQueue.id == entry_id)
             .first()
         )
         if not entry:
             return
-
-        entry.status = EssayProcessingStatus.FEEDBACK_EXTRACTION
+        # Loaded before the commit, so no transaction stays open while the
+        # model runs.
+        essay = db.query(Essay).filter(Essay.id == entry.essay_id).first()
+        original_content = essay and load_blob(db, essay.original_content_sha256)
+        analyzed_content = essay and load_blob(db, essay.analyzed_content_sha256)
+        publish_queue_event(db, entry)
         db.commit()
 
-        essay = db.query(Essay).filter(Essay.id == entry.essay_id).first()
-        if not essay or not essay.original_content or not essay.analyzed_content:
+        if not original_content or not analyzed_content:
             logging.error(
                 f"Essay with ID {entry.essay_id} not found or missing content for feedback extraction."
             )
-            entry.status = EssayProcessingStatus.ERROR
-            entry.retries += 1
-            db.commit()
-            user = db.query(User).filter(User.id == entry.user_id).first()
-            if user and user.push_token:
-                send_push_notification(
-                    push_token=user.push_token,
-                    title="Essay Error",
-                    body="There was a problem processing your essay.",
-                    data={"essay_id": entry.essay_id},
-                )
+            _fail_entry(db, entry, lease_owner)
             return
 
         try:
             logging.info(
                 f"Starting feedback extraction for essay with queue entry ID {entry_id}."
             )
-            feedback_response = asyncio.run(
-                chat_with_model(
+            feedback = run_sync(
+                ask_model(
                     get_essay_feedback_items_extraction_prompt(
-                        essay.original_content, essay.analyzed_content
-                    )
+                        original_content, analyzed_content
+                    ),
+                    FeedbackItemResponse,
                 )
             )
-            feedback = FeedbackItemResponse.model_validate_json(
-                extract_json_from_response(feedback_response)
-            )
-            bulk_entries_to_db(
-                FeedbackItem,
-                [
-                    {
-                        "user_id": entry.user_id,
-                        "essay_id": entry.essay_id,
-                        "feedback_origin": FeedbackOrigin.TEACHER,
-                        "category": item.category,
-                        "short_mistake_summary": item.short_mistake_summary,
-                        "comments": item.comments,
-                    }
-                    for item in feedback.feedback_items
-                ],
+            save_feedback_items(entry.user_id, entry.essay_id, feedback, db)
+            ensure_essay_lease(db, entry, lease_owner)
+            entry.status = EssayProcessingStatus.COMPLETED
+            release_lease(entry)
+            enqueue_push_notification(
+                db,
+                entry.user_id,
+                title="Essay Ready",
+                body="Your essay has been analysed.",
+                data={"essay_id": entry.essay_id},
             )
-
+            publish_queue_event(db, entry, ProcessingStage.FEEDBACK)
+            db.commit()
+        except LeaseLostError as e:
+            _drop_results(db, entry_id, e)
         except Exception as e:
             logging.error(
                 f"Error during feedback extraction for essay with queue entry ID {entry_id}: {e}"
             )
-            entry.status = EssayProcessingStatus.ERROR
-            entry.retries += 1
-            db.commit()
-            user = db.query(User).filter(User.id == entry.user_id).first()
-            if user and user.push_token:
-                send_push_notification(
-                    push_token=user.push_token,
-                    title="Essay Error",
-                    body="There was a problem processing your essay.",
-                    data={"essay_id": entry.essay_id},
-                )
-            return
-
-        entry.status = EssayProcessingStatus.COMPLETED
-        db.commit()
-        user = db.query(User).filter(User.id == entry.user_id).first()
-        if user and user.push_token:
-            send_push_notification(
-                push_token=user.push_token,
-                title="Essay Ready",
-                body="Your essay has been analysed.",
-                data={"essay_id": entry.essay_id},
-            )
+            db.rollback()
+            _fail_entry(db, entry, lease_owner)
 
 
-def process_essays_for_feedback_extraction():
-    # TODO: Handle the case to reprocess the situation when the feedback items were not extracted successfully.
-    entries_to_process = get_ids_by_status(
+def claim_essays_for_feedback_extraction(limit: int) -> list[LeaseClaim]:
+    return claim_by_status(
         EssayProcessingQueue,
         "status",
-        EssayProcessingStatus.READY_FOR_FEEDBACK_EXTRACTION,
+        [EssayProcessingStatus.READY_FOR_FEEDBACK_EXTRACTION],
+        EssayProcessingStatus.FEEDBACK_EXTRACTION,
+        limit,
+        LEASE_OWNER,
+        settings.queue_claim_lease_seconds,
+        EssayProcessingQueue.retries < MAXIMUM_RETRIES,
     )
 
-    logging.info(
-        f"Found {len(entries_to_process)} essays ready for feedback extraction."
-    )
 
-    for entry_id in entries_to_process:
-        process_single_essay_for_feedback(entry_id)
+def process_essays_for_feedback_extraction():
+    # TODO: Handle the case to reprocess the situation when the feedback items were not extracted successfully.
+    claims = essay_pool.dispatch(
+        claim_essays_for_feedback_extraction, process_single_essay_for_feedback
+    )
+    if claims:
+        logging.info(f"Claimed {len(claims)} essays for feedback extraction.")
@@ -1,20 +1,44 @@
-import asyncio
 import logging
+from concurrent.futures import as_completed
 
+from sqlalchemy.orm import Session
+
+from ..config import settings
+from ..database.blob_store import load_blob, replace_blob
 from ..database.database import get_db
 from ..database.entities import (
     Essay,
     EssayAnalysis,
     EssayProcessingQueue,
     EssayProcessingStatus,
+    FeedbackItem,
+    FeedbackOrigin,
     User,
 )
-from ..database.helpers import get_ids_by_status, single_entry_to_db, update_by_id
-from ..llm.llm_helper import chat_with_model, extract_json_from_response
+from ..database.helpers import (
+    LeaseClaim,
+    LeaseLostError,
+    claim_by_status,
+    release_lease,
+    single_entry_to_db,
+    update_by_id,
+)
+from ..event_loop import run_sync, submit
+from ..llm.llm_helper import ask_model
 from ..llm.prompts.essay_cerf_level_extractor import get_cerf_level_extraction_prompt
 from ..llm.prompts.essay_extraction_instruction import get_prompt_for_essay_extraction
-from ..llm.schemas import CerfLevelResponse, EssayExtractionResponse
-from ..services.notification_service import send_push_notification
+from ..llm.prompts.essay_feedback_items_extractor import (
+    get_essay_feedback_items_extraction_prompt,
+)
+from ..llm.schemas import (
+    CerfLevelResponse,
+    EssayExtractionResponse,
+    FeedbackItemResponse,
+)
+from ..services.notification_service import enqueue_push_notification
+from ..services.queue_events import ProcessingStage, publish_queue_event
+from .essay_analyser import save_feedback_items
+from .worker_pool import LEASE_OWNER, ensure_essay_lease, essay_pool
 
 logging.basicConfig(
     level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s"
@@ -24,14 +48,127 @@ logging.basicConfig(
 MAXIMUM_RETRIES = 2
 
 
-def process_essay(entry_id: int) -> None:
+async def extract_feedback_items(
+    extraction: EssayExtractionResponse,
+) -> FeedbackItemResponse | Exception:
+    try:
+        return await ask_model(
+            get_essay_feedback_items_extraction_prompt(
+                extraction.original_content, extraction.analyzed_content
+            ),
+            FeedbackItemResponse,
+        )
+    except Exception as e:
+        return e
+
+
+def _store_extraction(
+    db: Session,
+    entry: EssayProcessingQueue,
+    lease_owner: str,
+    extraction: EssayExtractionResponse,
+) -> None:
+    # A retry starts over, so drop what an earlier attempt already stored.
+    db.query(EssayAnalysis).filter(EssayAnalysis.essay_id == entry.essay_id).delete()
+    db.query(FeedbackItem).filter(
+        FeedbackItem.essay_id == entry.essay_id,
+        FeedbackItem.feedback_origin == FeedbackOrigin.TEACHER,
+    ).delete()
+    essay = db.get(Essay, entry.essay_id)
+    if essay:
+        essay.original_content_sha256 = replace_blob(
+            db, essay.original_content_sha256, extraction.original_content
+        )
+        essay.analyzed_content_sha256 = replace_blob(
+            db, essay.analyzed_content_sha256, extraction.analyzed_content
+        )
+        db.flush()
+    publish_queue_event(db, entry, ProcessingStage.EXTRACTION)
+    ensure_essay_lease(db, entry, lease_owner)
+    db.commit()
+
+
+def _store_cerf(
+    db: Session, entry: EssayProcessingQueue, lease_owner: str, cerf: CerfLevelResponse
+) -> None:
+    update_by_id(Essay, entry.essay_id, {"cerf_level_grade": cerf.cefr_level}, db)
+    single_entry_to_db(
+        EssayAnalysis,
+        {
+            "user_id": entry.user_id,
+            "essay_id": entry.essay_id,
+            "analysis_result": cerf.reasoning,
+            "confidence": cerf.confidence,
+            "recommendations": cerf.recommendation,
+        },
+        db,
+    )
+    publish_queue_event(db, entry, ProcessingStage.CEFR)
+    ensure_essay_lease(db, entry, lease_owner)
+    db.commit()
+
+
+def _store_feedback(
+    db: Session,
+    entry: EssayProcessingQueue,
+    lease_owner: str,
+    feedback: FeedbackItemResponse,
+) -> None:
+    save_feedback_items(entry.user_id, entry.essay_id, feedback, db)
+    publish_queue_event(db, entry, ProcessingStage.FEEDBACK)
+    ensure_essay_lease(db, entry, lease_owner)
+    db.commit()
+
+
+def _grade_and_extract_feedback(
+    db: Session,
+    entry: EssayProcessingQueue,
+    lease_owner: str,
+    extraction: EssayExtractionResponse,
+    target_cefr_level: str,
+) -> FeedbackItemResponse | Exception:
+    """
+    Grade the essay and extract its feedback at the same time, and store each
+    result as soon as it arrives so clients watching the essay get it early.
+    A failed feedback extraction is returned so the grade is still kept.
+    """
+    cerf_future = submit(
+        ask_model(
+            get_cerf_level_extraction_prompt(
+                original_content=extraction.original_content,
+                analyzed_content=extraction.analyzed_content,
+                target_cefr_level=target_cefr_level,
+            ),
+            CerfLevelResponse,
+        )
+    )
+    feedback_future = submit(extract_feedback_items(extraction))
+    try:
+        for future in as_completed([cerf_future, feedback_future]):
+            if future is cerf_future:
+                _store_cerf(db, entry, lease_owner, cerf_future.result())
+                logging.info(
+                    f"Stored CEFR grade for essay with queue entry ID {entry.id}"
+                )
+            elif not isinstance(feedback_future.result(), Exception):
+                _store_feedback(db, entry, lease_owner, feedback_future.result())
+    finally:
+        feedback_future.cancel()
+    return feedback_future.result()
+
+
+def _drop_results(db: Session, entry_id: int, error: LeaseLostError) -> None:
+    db.rollback()
+    logging.warning(
+        f"Dropped the results for essay queue entry {entry_id}, its lease was lost: {error}"
+    )
+
+
+def process_essay(entry_id: int, lease_owner: str) -> None:
     with get_db() as db:
         entry = (
             db.query(EssayProcessingQueue)
-            .filter(
-                EssayProcessingQueue.id == entry_id,
-                EssayProcessingQueue.retries < MAXIMUM_RETRIES,
-            )
+            .filter(EssayProcessingQueue.id == entry_id)
             .first()
         )
         if not entry:
@@ -44,100 +181,107 @@ def process_essay(entry_id: int) -> None:
             logging.error(
                 f"User with ID {entry.user_id} not found or missing target CEFR level for essay processing."
             )
+            try:
+                ensure_essay_lease(db, entry, lease_owner)
+            except LeaseLostError as e:
+                _drop_results(db, entry_id, e)
+                return
+            entry.status = EssayProcessingStatus.ERROR
+            entry.retries += 1
+            release_lease(entry)
+            publish_queue_event(db, entry)
+            db.commit()
             return
 
-        entry.status = EssayProcessingStatus.PROCESSING
+        logging.info(f"Processing essay with queue entry ID: {entry_id}")
+        # Loaded before the commit, so no transaction stays open while the
+        # model runs.
+        raw_content = load_blob(db, entry.raw_content_sha256)
+        publish_queue_event(db, entry)
         db.commit()
 
         try:
-            extraction_response = asyncio.run(
-                chat_with_model(get_prompt_for_essay_extraction(entry.raw_content))
-            )
-            extraction = EssayExtractionResponse.model_validate_json(
-                extract_json_from_response(extraction_response)
-            )
-
-            cerf_response = asyncio.run(
-                chat_with_model(
-                    get_cerf_level_extraction_prompt(
-                        target_cefr_level,
-                        extraction.original_content,
-                        extraction.analyzed_content,
-                    )
+            extraction = run_sync(
+                ask_model(
+                    get_prompt_for_essay_extraction(raw_content),
+                    EssayExtractionResponse,
                 )
             )
-            logging.info(
-                f"Received CEFR extraction response for essay with queue entry ID {entry_id}"
-            )
-            cerf = CerfLevelResponse.model_validate_json(
-                extract_json_from_response(cerf_response)
-            )
-            update_by_id(
-                Essay,
-                entry.essay_id,
-                {
-                    "original_content": extraction.original_content,
-                    "analyzed_content": extraction.analyzed_content,
-                    "cerf_level_grade": cerf.cefr_level,
-                },
-            )
+            _store_extraction(db, entry, lease_owner, extraction)
 
-            single_entry_to_db(
-                EssayAnalysis,
-                {
-                    "user_id": entry.user_id,
-                    "essay_id": entry.essay_id,
-                    "analysis_result": cerf.reasoning,
-                    "confidence": cerf.confidence,
-                    "recommendations": cerf.recommendation,
-                },
+            feedback = _grade_and_extract_feedback(
+                db, entry, lease_owner, extraction, target_cefr_level
             )
+            ensure_essay_lease(db, entry, lease_owner)
+            if isinstance(feedback, Exception):
+                logging.error(
+                    f"Feedback extraction failed for essay with queue entry ID {entry_id}, leaving it for the feedback job: {feedback}"
+                )
+                entry.status = EssayProcessingStatus.READY_FOR_FEEDBACK_EXTRACTION
+            else:
+                entry.status = EssayProcessingStatus.COMPLETED
+                enqueue_push_notification(
+                    db,
+                    entry.user_id,
+                    title="Essay Ready",
+                    body="Your essay has been analysed.",
+                    data={"essay_id": entry.essay_id},
+                )
+            release_lease(entry)
+            publish_queue_event(db, entry)
+            db.commit()
+        except LeaseLostError as e:
+            _drop_results(db, entry_id, e)
         except Exception:
             # TODO: When an error occurs, not in all sitautions will it moved to ERROR status, because some errors can be catched and handled in the chat_with_model function.
             # We need to make sure that all errors that can occur during processing are properly catched and handled, and that only those that are related to the LLM response parsing are catched in the process_essay function, so that we can properly move the entry to ERROR status when the LLM response is not valid or cannot be parsed.
             logging.exception(f"Failed to process essay queue entry {entry_id}")
-            with get_db() as error_db:
-                error_entry = (
-                    error_db.query(EssayProcessingQueue)
-                    .filter(EssayProcessingQueue.id == entry_id)
-                    .first()
-                )
-                if error_entry:
-                    error_entry.status = EssayProcessingStatus.ERROR
-                    error_entry.retries += 1
-                    error_db.commit()
-                    user = (
-                        error_db.query(User)
-                        .filter(User.id == error_entry.user_id)
-                        .first()
-                    )
-                    if user and user.push_token:
-                        send_push_notification(
-                            push_token=user.push_token,
-                            title="Essay Error",
-                            body="There was a problem processing your essay.",
-                            data={"essay_id": error_entry.essay_id},
-                        )
-            return
-
-        entry.status = EssayProcessingStatus.READY_FOR_FEEDBACK_EXTRACTION
-        db.commit()
+            db.rollback()
+            try:
+                ensure_essay_lease(db, entry, lease_owner)
+            except LeaseLostError as e:
+                _drop_results(db, entry_id, e)
+                return
+            entry.status = EssayProcessingStatus.ERROR
+            entry.retries += 1
+            release_lease(entry)
+            enqueue_push_notification(
+                db,
+                entry.user_id,
+                title="Essay Error",
+                body="There was a problem processing your essay.",
+                data={"essay_id": entry.essay_id},
+            )
+            publish_queue_event(db, entry)
+            db.commit()
 
 
-def process_pending_essays():
-    pending_ids = get_ids_by_status(
-        EssayProcessingQueue, "status", EssayProcessingStatus.PENDING
+def claim_essays_for_processing(
+    limit: int, retry_failed: bool = True
+) -> list[LeaseClaim]:
+    statuses = [EssayProcessingStatus.PENDING]
+    if retry_failed:
+        statuses.append(EssayProcessingStatus.ERROR)
+    return claim_by_status(
+        EssayProcessingQueue,
+        "status",
+        statuses,
+        EssayProcessingStatus.PROCESSING,
+        limit,
+        LEASE_OWNER,
+        settings.queue_claim_lease_seconds,
+        EssayProcessingQueue.retries < MAXIMUM_RETRIES,
     )
-    error_ids = get_ids_by_status(
-        EssayProcessingQueue, "status", EssayProcessingStatus.ERROR
-    )
-    logging.info(
-        f"Found {len(pending_ids)} pending essays to process. Found {len(error_ids)} essays to re-process due to previous errors."
-    )
-    for entry_id in pending_ids:
-        logging.info(f"Processing essay with queue entry ID: {entry_id}")
-        process_essay(entry_id)
 
-    for entry_id in error_ids:
-        logging.info(f"Re-processing essay with queue entry ID: {entry_id}")
-        process_essay(entry_id)
+
+def process_pending_essays(retry_failed: bool = True):
+    """
+    Hand queued essays to free workers. Failed essays are only retried by
+    the periodic run, not when the queue listener wakes us up.
+    """
+    claims = essay_pool.dispatch(
+        lambda limit: claim_essays_for_processing(limit, retry_failed),
+        process_essay,
+    )
+    if claims:
+        logging.info(f"Claimed {len(claims)} essays to process.")
@@ -1,25 +1,94 @@
+from datetime import UTC, datetime
+
 from apscheduler.schedulers.background import BackgroundScheduler
 
-from .cleanup_job import cleanup_completed_queue_entries
+from ..config import settings
+from ..database.entities import EssayProcessingStatus
+from ..llm.response_cache import evict_cached_responses
+from .cleanup_job import (
+    archive_finished_queue_entries,
+    cleanup_notification_outbox,
+    drop_expired_archive_partitions,
+)
 from .essay_analyser import process_essays_for_feedback_extraction
 from .essay_builder import process_pending_essays
+from .notification_outbox_job import drain_notification_outbox
+from .worker_pool import renew_essay_leases
 
 scheduler = BackgroundScheduler()
 
+DRAIN_NOTIFICATIONS_JOB_ID = "drain_notification_outbox_job"
+# Queue statuses whose transaction also writes a push notification.
+NOTIFYING_STATUSES = {EssayProcessingStatus.COMPLETED, EssayProcessingStatus.ERROR}
+
+
+def dispatch_new_essays() -> None:
+    process_pending_essays(retry_failed=False)
+
+
+def wake_notification_drainer(event: dict) -> None:
+    if event["status"] in NOTIFYING_STATUSES:
+        scheduler.modify_job(
+            DRAIN_NOTIFICATIONS_JOB_ID, next_run_time=datetime.now(UTC)
+        )
+
+
+# The queue listener dispatches new essays as soon as they are registered;
+# polling only retries failed entries and catches anything it missed.
 scheduler.add_job(
-    process_pending_essays, "interval", seconds=30, id="process_pending_essays_job"
+    process_pending_essays,
+    "interval",
+    seconds=settings.queue_poll_interval_seconds,
+    id="process_pending_essays_job",
 )
 
 scheduler.add_job(
     process_essays_for_feedback_extraction,
     "interval",
-    seconds=30,
+    seconds=settings.queue_poll_interval_seconds,
     id="process_essays_for_feedback_extraction_job",
 )
 
 scheduler.add_job(
-    cleanup_completed_queue_entries,
+    renew_essay_leases,
+    "interval",
+    seconds=settings.queue_lease_renew_seconds,
+    id="renew_essay_leases_job",
+)
+
+# Queue events wake the drainer as soon as an essay finishes; polling picks
+# up retries and anything it missed.
+scheduler.add_job(
+    drain_notification_outbox,
+    "interval",
+    seconds=settings.notification_outbox_poll_seconds,
+    id=DRAIN_NOTIFICATIONS_JOB_ID,
+)
+
+scheduler.add_job(
+    archive_finished_queue_entries,
+    "interval",
+    hours=1,
+    id="archive_finished_queue_entries_job",
+)
+
+scheduler.add_job(
+    drop_expired_archive_partitions,
+    "interval",
+    hours=24,
+    id="drop_expired_archive_partitions_job",
+)
+
+scheduler.add_job(
+    cleanup_notification_outbox,
+    "interval",
+    hours=1,
+    id="cleanup_notification_outbox_job",
+)
+
+scheduler.add_job(
+    evict_cached_responses,
     "interval",
-    hours=12,
-    id="cleanup_completed_queue_entries_job",
+    hours=1,
+    id="evict_cached_responses_job",
 )
@@ -0,0 +1,199 @@
+import logging
+import threading
+from datetime import UTC, datetime, timedelta
+
+from sqlalchemy import Row, Update, func, select, update
+
+from ..config import settings
+from ..database.database import get_db
+from ..database.entities import NotificationOutbox, NotificationStatus, User
+from ..event_loop import run_sync
+from ..services.notification_service import (
+    EXPO_MAX_BATCH_SIZE,
+    build_push_message,
+    is_unregistered_device,
+    send_push_messages,
+)
+
+logging.basicConfig(
+    level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s"
+)
+
+_stats_lock = threading.Lock()
+_stats = {"sent": 0, "failed": 0, "skipped": 0, "retried": 0, "total_lag_seconds": 0.0}
+_max_lag_seconds = 0.0
+
+
+def _claim_statement(limit: int) -> Update:
+    """
+    Claim due rows by pushing their next attempt past the claim window, so
+    other drainers skip them while they are being sent. Rows of a drainer
+    that dies mid-send become due again once the window has passed.
+    """
+    claimable = (
+        select(NotificationOutbox.id)
+        .where(
+            NotificationOutbox.status == NotificationStatus.PENDING,
+            NotificationOutbox.next_attempt_at <= func.now(),
+        )
+        .order_by(NotificationOutbox.next_attempt_at)
+        .limit(limit)
+        .with_for_update(skip_locked=True)
+        .cte("claimable")
+    )
+    push_token = (
+        select(User.push_token)
+        .where(User.id == NotificationOutbox.user_id)
+        .scalar_subquery()
+    )
+    return (
+        update(NotificationOutbox)
+        .where(NotificationOutbox.id.in_(select(claimable.c.id)))
+        .values(
+            next_attempt_at=func.now()
+            + timedelta(seconds=settings.notification_claim_seconds)
+        )
+        .returning(
+            NotificationOutbox.id,
+            NotificationOutbox.title,
+            NotificationOutbox.body,
+            NotificationOutbox.data,
+            NotificationOutbox.next_attempt_at.label("claimed_until"),
+            push_token.label("push_token"),
+        )
+    )
+
+
+def _retry_later(entry: NotificationOutbox, error: str) -> None:
+    entry.attempts += 1
+    entry.last_error = error
+    if entry.attempts >= settings.notification_max_attempts:
+        entry.status = NotificationStatus.FAILED
+        _count("failed")
+        return
+    backoff = settings.notification_retry_backoff_seconds * 2 ** (entry.attempts - 1)
+    entry.next_attempt_at = datetime.now(UTC) + timedelta(seconds=backoff)
+    _count("retried")
+
+
+def _mark_sent(entry: NotificationOutbox) -> None:
+    global _max_lag_seconds  # noqa: PLW0603
+    entry.status = NotificationStatus.SENT
+    entry.sent_at = datetime.now(UTC)
+    lag = (entry.sent_at - entry.created_at).total_seconds()
+    with _stats_lock:
+        _stats["sent"] += 1
+        _stats["total_lag_seconds"] += lag
+        _max_lag_seconds = max(_max_lag_seconds, lag)
+
+
+def _count(key: str) -> None:
+    with _stats_lock:
+        _stats[key] += 1
+
+
+def _claim_batch(limit: int) -> list[Row]:
+    with get_db() as db:
+        rows = db.execute(_claim_statement(limit)).all()
+        db.commit()
+        return list(rows)
+
+
+def _record_outcomes(
+    rows: list[Row], tickets: dict[int, dict], error: str | None
+) -> None:
+    """
+    Store what happened to each claimed row. Rows whose claim ran out and
+    were claimed again by another drainer are left to that drainer.
+    """
+    with get_db() as db:
+        entries = db.scalars(
+            select(NotificationOutbox)
+            .where(
+                NotificationOutbox.id.in_([row.id for row in rows]),
+                NotificationOutbox.next_attempt_at == rows[0].claimed_until,
+            )
+            .with_for_update()
+        ).all()
+        for entry in entries:
+            ticket = tickets.get(entry.id)
+            if ticket is None and error is None:
+                entry.status = NotificationStatus.SKIPPED
+                _count("skipped")
+            elif ticket is None:
+                _retry_later(entry, error)
+            elif ticket["status"] == "ok":
+                _mark_sent(entry)
+            elif is_unregistered_device(ticket):
+                entry.status = NotificationStatus.FAILED
+                entry.last_error = "DeviceNotRegistered"
+                _count("failed")
+            else:
+                _retry_later(entry, ticket.get("message", "unknown error"))
+        db.commit()
+
+
+def _drain_batch(limit: int) -> int:
+    """
+    Claim one batch of due notifications in a short transaction, send it
+    with no database connection held, then record every row's outcome in a
+    second transaction. A crash in between leaves the rows to be sent again
+    once their claim runs out.
+    """
+    rows = _claim_batch(limit)
+    if not rows:
+        return 0
+
+    to_send = [row for row in rows if row.push_token]
+    tickets: dict[int, dict] = {}
+    error = None
+    if to_send:
+        try:
+            sent_tickets = run_sync(
+                send_push_messages(
+                    [
+                        build_push_message(
+                            row.push_token, row.title, row.body, row.data
+                        )
+                        for row in to_send
+                    ]
+                )
+            )
+        except Exception as e:
+            logging.error(f"Failed to send {len(to_send)} push notifications: {e}")
+            error = str(e)
+        else:
+            tickets = {
+                row.id: ticket
+                for row, ticket in zip(to_send, sent_tickets, strict=True)
+            }
+
+    _record_outcomes(rows, tickets, error)
+    return len(rows)
+
+
+def drain_notification_outbox() -> None:
+    batch_size = min(settings.push_batch_size, EXPO_MAX_BATCH_SIZE)
+    drained = 0
+    while True:
+        claimed = _drain_batch(batch_size)
+        drained += claimed
+        if claimed < batch_size:
+            break
+    if drained:
+        logging.info(f"Drained {drained} notifications from the outbox.")
+
+
+def get_outbox_stats() -> dict[str, float | int]:
+    with _stats_lock:
+        sent = _stats["sent"]
+        return {
+            "sent": sent,
+            "failed": _stats["failed"],
+            "skipped": _stats["skipped"],
+            "retried": _stats["retried"],
+            "avg_lag_ms": round(1000 * _stats["total_lag_seconds"] / sent, 1)
+            if sent
+            else 0.0,
+            "max_lag_ms": round(1000 * _max_lag_seconds, 1),
+        }
@@ -0,0 +1,100 @@
+import json
+import logging
+import threading
+from collections.abc import Callable
+
+import psycopg
+
+from ..database.database import database_url
+from ..database.entities import EssayProcessingStatus
+from ..services.queue_events import ESSAY_QUEUE_CHANNEL
+
+logging.basicConfig(
+    level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s"
+)
+
+WAIT_SECONDS = 0.5
+RECONNECT_DELAY_SECONDS = 5
+
+DISPATCH_STATUSES = {EssayProcessingStatus.PENDING}
+
+_wakeup = threading.Event()
+_stop = threading.Event()
+_thread: threading.Thread | None = None
+_event_handlers: dict[str, list[Callable[[dict], None]]] = {}
+
+
+def request_dispatch() -> None:
+    _wakeup.set()
+
+
+def add_event_handler(channel: str, handler: Callable[[dict], None]) -> None:
+    """
+    Call `handler` on the listener thread with every JSON event published on
+    `channel` by any replica. Register handlers before the listener starts;
+    they must be quick and must not block.
+    """
+    handlers = _event_handlers.setdefault(channel, [])
+    if handler not in handlers:
+        handlers.append(handler)
+
+
+def add_queue_event_handler(handler: Callable[[dict], None]) -> None:
+    add_event_handler(ESSAY_QUEUE_CHANNEL, handler)
+
+
+def _handle_event(channel: str, event: dict) -> None:
+    for handler in _event_handlers.get(channel, ()):
+        try:
+            handler(event)
+        except Exception:
+            logging.exception(f"Event handler {handler.__name__} failed")
+
+
+def _listen(dispatch: Callable[[], None]) -> None:
+    conninfo = database_url.set(drivername="postgresql").render_as_string(
+        hide_password=False
+    )
+    while not _stop.is_set():
+        try:
+            with psycopg.connect(conninfo, autocommit=True) as conn:
+                channels = {ESSAY_QUEUE_CHANNEL, *_event_handlers}
+                for channel in channels:
+                    conn.execute(f"LISTEN {channel}")
+                logging.info(f"Listening for events on {', '.join(sorted(channels))}.")
+                # Catch up on anything queued while we were not listening.
+                _wakeup.set()
+                while not _stop.is_set():
+                    for notification in conn.notifies(timeout=WAIT_SECONDS):
+                        event = json.loads(notification.payload)
+                        _handle_event(notification.channel, event)
+                        if (
+                            notification.channel == ESSAY_QUEUE_CHANNEL
+                            and event["status"] in DISPATCH_STATUSES
+                        ):
+                            _wakeup.set()
+                    if _wakeup.is_set():
+                        _wakeup.clear()
+                        dispatch()
+        except Exception as e:
+            logging.error(f"Essay queue listener failed, reconnecting: {e}")
+            _stop.wait(RECONNECT_DELAY_SECONDS)
+
+
+def start_queue_listener(dispatch: Callable[[], None]) -> None:
+    """
+    Run dispatch on a background thread whenever an entry becomes ready
+    for a stage or a worker frees up, instead of waiting for the next poll.
+    """
+    global _thread  # noqa: PLW0603
+    _stop.clear()
+    _thread = threading.Thread(
+        target=_listen, args=(dispatch,), name="queue-listener", daemon=True
+    )
+    _thread.start()
+
+
+def stop_queue_listener() -> None:
+    _stop.set()
+    if _thread:
+        _thread.join()
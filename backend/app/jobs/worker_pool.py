@@ -0,0 +1,125 @@
+import logging
+import os
+import socket
+import threading
+from collections.abc import Callable
+from concurrent.futures import Future, ThreadPoolExecutor
+from functools import partial
+
+from sqlalchemy.orm import Session
+
+from ..config import settings
+from ..database.entities import EssayProcessingQueue
+from ..database.helpers import LeaseClaim, ensure_lease_held, renew_leases
+from .queue_listener import request_dispatch
+
+logging.basicConfig(
+    level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s"
+)
+
+
+class WorkerPool:
+    """
+    Fixed-size thread pool that never queues more work than it can start.
+    Callers reserve free slots before claiming work, so anything left over
+    stays in the database queue for the next run (backpressure).
+    """
+
+    def __init__(
+        self,
+        name: str,
+        max_workers: int,
+        on_slot_freed: Callable[[], None] | None = None,
+    ):
+        self.name = name
+        self.max_workers = max_workers
+        self.on_slot_freed = on_slot_freed
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix=name
+        )
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        # Lease owners of the claims being worked on.
+        self._running: set[str] = set()
+
+    def free_slots(self) -> int:
+        with self._lock:
+            return self.max_workers - self._in_flight
+
+    def running_leases(self) -> list[str]:
+        with self._lock:
+            return list(self._running)
+
+    def dispatch(
+        self,
+        claim: Callable[[int], list[LeaseClaim]],
+        fn: Callable[[int, str], object],
+    ) -> list[LeaseClaim]:
+        """
+        Reserve every free slot, claim at most that many entries and run fn
+        with the id and lease owner of each claim. Unused slots are handed
+        back straight away.
+        """
+        reserved = self._reserve_slots()
+        try:
+            claims = claim(reserved)
+        except Exception:
+            self._release_slots(reserved)
+            raise
+
+        self._release_slots(reserved - len(claims))
+        with self._lock:
+            self._running.update(lease_owner for _, lease_owner in claims)
+        for entry_id, lease_owner in claims:
+            future = self._executor.submit(fn, entry_id, lease_owner)
+            future.add_done_callback(partial(self._on_done, lease_owner))
+        return claims
+
+    def _reserve_slots(self) -> int:
+        with self._lock:
+            reserved = self.max_workers - self._in_flight
+            self._in_flight = self.max_workers
+            return reserved
+
+    def _release_slots(self, count: int) -> None:
+        with self._lock:
+            self._in_flight -= count
+
+    def _on_done(self, lease_owner: str, future: Future) -> None:
+        with self._lock:
+            self._running.discard(lease_owner)
+        self._release_slots(1)
+        if self.on_slot_freed:
+            self.on_slot_freed()
+        if not future.cancelled() and (exception := future.exception()):
+            logging.error(f"Worker in pool {self.name} failed: {exception}")
+
+    def shutdown(self, wait: bool = True) -> None:
+        self._executor.shutdown(wait=wait, cancel_futures=True)
+
+
+# Prefix of the lease owner of every claim this process makes; each claim
+# adds its own random suffix.
+LEASE_OWNER = f"{socket.gethostname()}:{os.getpid()}"
+
+essay_pool = WorkerPool(
+    "essay-worker", settings.essay_worker_count, on_slot_freed=request_dispatch
+)
+
+
+def renew_essay_leases() -> None:
+    """
+    Heartbeat for the queue entries this process is working on, so an essay
+    stuck behind slow LLM calls is not claimed a second time.
+    """
+    renew_leases(
+        EssayProcessingQueue,
+        essay_pool.running_leases(),
+        settings.queue_claim_lease_seconds,
+    )
+
+
+def ensure_essay_lease(
+    db: Session, entry: EssayProcessingQueue, lease_owner: str
+) -> None:
+    ensure_lease_held(db, EssayProcessingQueue, entry.id, lease_owner)
@@ -0,0 +1,93 @@
+import logging
+import threading
+from dataclasses import dataclass
+
+
+class JsonObjectScanner:
+    """
+    Incrementally scans streamed model output and returns the first complete
+    top-level JSON object as soon as its closing brace arrives. Markdown
+    fences or prose before the object are skipped.
+    """
+
+    def __init__(self):
+        self._parts: list[str] = []
+        self._depth = 0
+        self._in_string = False
+        self._escaped = False
+
+    def feed(self, chunk: str) -> str | None:
+        start = 0 if self._depth else None
+        for index, char in enumerate(chunk):
+            if self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif char == "\\":
+                    self._escaped = True
+                elif char == '"':
+                    self._in_string = False
+            elif char == '"' and self._depth:
+                self._in_string = True
+            elif char == "{":
+                if not self._depth:
+                    start = index
+                self._depth += 1
+            elif char == "}" and self._depth:
+                self._depth -= 1
+                if not self._depth:
+                    self._parts.append(chunk[start : index + 1])
+                    return "".join(self._parts)
+
+        if self._depth:
+            self._parts.append(chunk[start:])
+        return None
+
+
+@dataclass
+class StreamTimings:
+    prompts: int = 0
+    chunks: int = 0
+    stopped_early: int = 0
+    total_first_token_seconds: float = 0.0
+    total_stream_seconds: float = 0.0
+
+
+_timings_lock = threading.Lock()
+_timings: dict[str, StreamTimings] = {}
+
+
+def record_stream_timings(
+    label: str,
+    chunks: int,
+    first_token_seconds: float,
+    stream_seconds: float,
+    stopped_early: bool,
+) -> None:
+    logging.info(
+        f"Streamed {label}: first token after {1000 * first_token_seconds:.0f} ms, "
+        f"{chunks} chunks in {1000 * stream_seconds:.0f} ms, stopped early: {stopped_early}"
+    )
+    with _timings_lock:
+        timings = _timings.setdefault(label, StreamTimings())
+        timings.prompts += 1
+        timings.chunks += chunks
+        timings.stopped_early += int(stopped_early)
+        timings.total_first_token_seconds += first_token_seconds
+        timings.total_stream_seconds += stream_seconds
+
+
+def get_stream_stats() -> dict[str, dict[str, float]]:
+    with _timings_lock:
+        return {
+            label: {
+                "prompts": timings.prompts,
+                "stopped_early": timings.stopped_early,
+                "avg_first_token_ms": 1000
+                * timings.total_first_token_seconds
+                / timings.prompts,
+                "avg_token_latency_ms": 1000
+                * (timings.total_stream_seconds - timings.total_first_token_seconds)
+                / max(timings.chunks - timings.prompts, 1),
+            }
+            for label, timings in _timings.items()
+        }
@@ -1,36 +1,179 @@
+import asyncio
+import json
+import logging
+import time
+from collections.abc import AsyncIterator
+from contextlib import aclosing
+
 import httpx
 from groq import AsyncGroq
+from pydantic import BaseModel, ValidationError
 
 from ..config import settings
+from .json_stream import JsonObjectScanner, record_stream_timings
+from .response_cache import (
+    build_cache_key,
+    discard_cached_response,
+    get_cached_response,
+    store_response,
+)
 
+_provider_limits = {
+    "groq": asyncio.Semaphore(settings.groq_max_concurrency),
+    "ollama": asyncio.Semaphore(settings.ollama_max_concurrency),
+}
 
-async def _chat_ollama(prompt: str) -> str:
-    async with httpx.AsyncClient() as client:
-        response = await client.post(
-            settings.llm_chat_url,
-            json={
-                "model": settings.llm_model,
-                "messages": [{"role": "user", "content": prompt}],
-                "stream": False,
-                "options": {"num_thread": settings.llm_num_threads},
-            },
-            timeout=300.0,
+# Created lazily on the shared event loop and reused by every request so
+# connections are kept alive between prompts.
+_ollama_client: httpx.AsyncClient | None = None
+_groq_client: AsyncGroq | None = None
+
+
+def _create_http_client() -> httpx.AsyncClient:
+    return httpx.AsyncClient(
+        http2=settings.llm_http2,
+        limits=httpx.Limits(
+            max_connections=settings.llm_max_connections,
+            max_keepalive_connections=settings.llm_max_keepalive_connections,
+            keepalive_expiry=settings.llm_keepalive_expiry_seconds,
+        ),
+        timeout=settings.llm_timeout_seconds,
+    )
+
+
+def _get_ollama_client() -> httpx.AsyncClient:
+    global _ollama_client  # noqa: PLW0603
+    if _ollama_client is None:
+        _ollama_client = _create_http_client()
+    return _ollama_client
+
+
+def _get_groq_client() -> AsyncGroq:
+    global _groq_client  # noqa: PLW0603
+    if _groq_client is None:
+        _groq_client = AsyncGroq(
+            api_key=settings.groq_api_key, http_client=_create_http_client()
         )
-        data = response.json()
-        if "message" not in data:
-            raise ValueError(f"Unexpected Ollama response: {data}")
-        return data["message"]["content"]
+    return _groq_client
+
+
+async def close_llm_clients() -> None:
+    global _ollama_client, _groq_client  # noqa: PLW0603
+    if _ollama_client is not None:
+        await _ollama_client.aclose()
+        _ollama_client = None
+    if _groq_client is not None:
+        await _groq_client.close()
+        _groq_client = None
+
+
+async def _chat_ollama(prompt: str) -> str:
+    response = await _get_ollama_client().post(
+        settings.llm_chat_url,
+        json={
+            "model": settings.llm_model,
+            "messages": [{"role": "user", "content": prompt}],
+            "stream": False,
+            "options": {"num_thread": settings.llm_num_threads},
+        },
+    )
+    data = response.json()
+    if "message" not in data:
+        raise ValueError(f"Unexpected Ollama response: {data}")
+    return data["message"]["content"]
 
 
 async def _chat_groq(prompt: str) -> str:
-    client = AsyncGroq(api_key=settings.groq_api_key)
-    chat_completion = await client.chat.completions.create(
+    chat_completion = await _get_groq_client().chat.completions.create(
         messages=[{"role": "user", "content": prompt}],
         model=settings.llm_model,
     )
     return chat_completion.choices[0].message.content
 
 
+async def _stream_ollama(prompt: str) -> AsyncIterator[str]:
+    async with _get_ollama_client().stream(
+        "POST",
+        settings.llm_chat_url,
+        json={
+            "model": settings.llm_model,
+            "messages": [{"role": "user", "content": prompt}],
+            "stream": True,
+            "options": {"num_thread": settings.llm_num_threads},
+        },
+    ) as response:
+        async for line in response.aiter_lines():
+            if not line:
+                continue
+            data = json.loads(line)
+            if "message" not in data and not data.get("done"):
+                raise ValueError(f"Unexpected Ollama response: {data}")
+            if content := data.get("message", {}).get("content"):
+                yield content
+            if data.get("done"):
+                return
+
+
+async def _stream_groq(prompt: str) -> AsyncIterator[str]:
+    stream = await _get_groq_client().chat.completions.create(
+        messages=[{"role": "user", "content": prompt}],
+        model=settings.llm_model,
+        stream=True,
+    )
+    async with stream:
+        async for chunk in stream:
+            if chunk.choices and (content := chunk.choices[0].delta.content):
+                yield content
+
+
+async def stream_json_from_model(prompt: str, label: str) -> str:
+    """
+    Stream the model reply and return the first complete JSON object in it,
+    closing the stream as soon as the object is done. Replies that grow past
+    `llm_stream_max_chars` or run longer than the LLM timeout are aborted.
+    """
+    if settings.llm_provider == "groq":
+        limit, chunks = _provider_limits["groq"], _stream_groq(prompt)
+    else:
+        limit, chunks = _provider_limits["ollama"], _stream_ollama(prompt)
+
+    scanner = JsonObjectScanner()
+    received_chars = chunk_count = 0
+    first_token_seconds = 0.0
+    async with limit, asyncio.timeout(settings.llm_timeout_seconds):
+        started_at = time.perf_counter()
+        async with aclosing(chunks):
+            async for chunk in chunks:
+                chunk_count += 1
+                if chunk_count == 1:
+                    first_token_seconds = time.perf_counter() - started_at
+                received_chars += len(chunk)
+
+                json_text = scanner.feed(chunk)
+                if json_text is not None:
+                    record_stream_timings(
+                        label,
+                        chunk_count,
+                        first_token_seconds,
+                        time.perf_counter() - started_at,
+                        stopped_early=True,
+                    )
+                    return json_text
+                if received_chars > settings.llm_stream_max_chars:
+                    raise ValueError(
+                        f"Aborted {label} generation after {received_chars} characters without a complete JSON object"
+                    )
+
+    record_stream_timings(
+        label,
+        chunk_count,
+        first_token_seconds,
+        time.perf_counter() - started_at,
+        stopped_early=False,
+    )
+    raise ValueError(f"Model stream for {label} ended without a complete JSON object")
+
+
 def extract_json_from_response(response: str) -> str:
     response = response.strip()
     if response.startswith("```"):
@@ -41,5 +184,46 @@ def extract_json_from_response(response: str) -> str:
 
 async def chat_with_model(prompt: str) -> str:
     if settings.llm_provider == "groq":
-        return await _chat_groq(prompt)
-    return await _chat_ollama(prompt)
+        async with _provider_limits["groq"]:
+            return await _chat_groq(prompt)
+    async with _provider_limits["ollama"]:
+        return await _chat_ollama(prompt)
+
+
+async def ask_model[M: BaseModel](prompt: str, response_model: type[M]) -> M:
+    """
+    Send prompt to the configured model and parse the reply into
+    response_model. Replies that parse are cached by prompt hash, so
+    retrying the same prompt skips the generation.
+    """
+    prompt_hash = build_cache_key(settings.llm_provider, settings.llm_model, prompt)
+    if settings.llm_cache_enabled:
+        cached = await asyncio.to_thread(get_cached_response, prompt_hash)
+        if cached is not None:
+            try:
+                result = response_model.model_validate_json(
+                    extract_json_from_response(cached)
+                )
+            except ValidationError as e:
+                logging.warning(
+                    f"Discarding cached LLM response for prompt {prompt_hash[:12]}, it does not match {response_model.__name__}: {e}"
+                )
+                await asyncio.to_thread(discard_cached_response, prompt_hash)
+            else:
+                logging.info(f"LLM cache hit for prompt {prompt_hash[:12]}.")
+                return result
+
+    if settings.llm_streaming:
+        response = await stream_json_from_model(prompt, response_model.__name__)
+    else:
+        response = await chat_with_model(prompt)
+    result = response_model.model_validate_json(extract_json_from_response(response))
+    if settings.llm_cache_enabled:
+        await asyncio.to_thread(
+            store_response,
+            prompt_hash,
+            settings.llm_provider,
+            settings.llm_model,
+            response,
+        )
+    return result
@@ -0,0 +1,145 @@
+import hashlib
+import logging
+import threading
+from datetime import UTC, datetime, timedelta
+
+from sqlalchemy import delete, select, update
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.exc import SQLAlchemyError
+
+from ..config import settings
+from ..database.database import get_db
+from ..database.entities import LlmResponseCache
+
+logging.basicConfig(
+    level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s"
+)
+
+_stats_lock = threading.Lock()
+_stats = {"hits": 0, "misses": 0, "invalid": 0, "stores": 0, "evictions": 0}
+
+
+def _count(stat: str, amount: int = 1) -> None:
+    with _stats_lock:
+        _stats[stat] += amount
+
+
+def get_cache_stats() -> dict[str, int]:
+    with _stats_lock:
+        return dict(_stats)
+
+
+def build_cache_key(provider: str, model: str, prompt: str) -> str:
+    return hashlib.sha256(f"{provider}\0{model}\0{prompt}".encode()).hexdigest()
+
+
+def _expiry_cutoff() -> datetime:
+    return datetime.now(UTC) - timedelta(hours=settings.llm_cache_ttl_hours)
+
+
+def get_cached_response(prompt_hash: str) -> str | None:
+    with get_db() as db:
+        try:
+            response = db.execute(
+                update(LlmResponseCache)
+                .where(
+                    LlmResponseCache.prompt_hash == prompt_hash,
+                    LlmResponseCache.created_at >= _expiry_cutoff(),
+                )
+                .values(
+                    hits=LlmResponseCache.hits + 1,
+                    last_accessed_at=datetime.now(UTC),
+                )
+                .returning(LlmResponseCache.response)
+            ).scalar_one_or_none()
+            db.commit()
+        except SQLAlchemyError:
+            db.rollback()
+            raise
+
+    _count("misses" if response is None else "hits")
+    return response
+
+
+def discard_cached_response(prompt_hash: str) -> None:
+    """
+    Delete a cached response that no longer validates against its response
+    model. The lookup that returned it is counted as invalid, not as a hit.
+    """
+    with get_db() as db:
+        try:
+            db.execute(
+                delete(LlmResponseCache).where(
+                    LlmResponseCache.prompt_hash == prompt_hash
+                )
+            )
+            db.commit()
+        except SQLAlchemyError:
+            db.rollback()
+            raise
+    _count("hits", -1)
+    _count("invalid")
+
+
+def store_response(prompt_hash: str, provider: str, model: str, response: str) -> None:
+    now = datetime.now(UTC)
+    statement = insert(LlmResponseCache).values(
+        prompt_hash=prompt_hash,
+        provider=provider,
+        model=model,
+        response=response,
+    )
+    with get_db() as db:
+        try:
+            db.execute(
+                statement.on_conflict_do_update(
+                    index_elements=[LlmResponseCache.prompt_hash],
+                    set_={
+                        "response": statement.excluded.response,
+                        "hits": 0,
+                        "created_at": now,
+                        "updated_at": now,
+                        "last_accessed_at": now,
+                    },
+                )
+            )
+            db.commit()
+        except SQLAlchemyError:
+            db.rollback()
+            raise
+    _count("stores")
+
+
+def evict_cached_responses() -> int:
+    """
+    Drop responses older than the TTL, then the least recently used ones
+    until the table fits into `llm_cache_max_entries`.
+    """
+    with get_db() as db:
+        try:
+            expired = db.execute(
+                delete(LlmResponseCache).where(
+                    LlmResponseCache.created_at < _expiry_cutoff()
+                )
+            ).rowcount
+            over_limit = db.execute(
+                delete(LlmResponseCache).where(
+                    LlmResponseCache.prompt_hash.in_(
+                        select(LlmResponseCache.prompt_hash)
+                        .order_by(LlmResponseCache.last_accessed_at.desc())
+                        .offset(settings.llm_cache_max_entries)
+                    )
+                )
+            ).rowcount
+            db.commit()
+        except SQLAlchemyError:
+            db.rollback()
+            raise
+
+    evicted = expired + over_limit
+    _count("evictions", evicted)
+    if evicted:
+        logging.info(
+            f"Evicted {expired} expired and {over_limit} least recently used LLM cache entries."
+        )
+    return evicted
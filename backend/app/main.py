@@ -1,17 +1,67 @@
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
 
 from .database import entities
-from .database.database import engine
-from .jobs.job_scheduler import scheduler
+from .database.database import async_engine, engine
+from .database.schema import add_missing_columns
+from .event_loop import run_sync, stop_event_loop
+from .jobs.job_scheduler import (
+    dispatch_new_essays,
+    scheduler,
+    wake_notification_drainer,
+)
+from .jobs.queue_listener import (
+    add_event_handler,
+    add_queue_event_handler,
+    start_queue_listener,
+    stop_queue_listener,
+)
+from .jobs.worker_pool import essay_pool
+from .llm.llm_helper import close_llm_clients
 from .routes.essay_route import router as essay_router
+from .routes.metrics_route import router as metrics_router
 from .routes.user_route import router as user_router
 from .routes.write_essay_route import router as write_essay_router
+from .services.essay_services import invalidate_essay_detail
+from .services.helpers.files_services import shutdown_file_pool
+from .services.helpers.pdf_services import shutdown_pdf_pool
+from .services.notification_service import close_push_client
+from .services.queue_event_hub import notify_subscribers
+from .services.user_services import USER_CACHE_CHANNEL, invalidate_cached_user
+
+
+@asynccontextmanager
+async def lifespan(_app: FastAPI):
+    scheduler.start()
+    add_queue_event_handler(invalidate_essay_detail)
+    add_queue_event_handler(notify_subscribers)
+    add_queue_event_handler(wake_notification_drainer)
+    add_event_handler(USER_CACHE_CHANNEL, invalidate_cached_user)
+    start_queue_listener(dispatch_new_essays)
+    yield
+    stop_queue_listener()
+    scheduler.shutdown(wait=False)
+    essay_pool.shutdown(wait=False)
+    shutdown_file_pool()
+    shutdown_pdf_pool()
+    run_sync(close_llm_clients())
+    run_sync(close_push_client())
+    stop_event_loop()
+    await async_engine.dispose()
+
 
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
 
 entities.Base.metadata.create_all(bind=engine)
-scheduler.start()
+# create_all skips tables that already exist, so add columns and indexes
+# defined later.
+add_missing_columns(engine)
+for table in entities.Base.metadata.sorted_tables:
+    for index in table.indexes:
+        index.create(bind=engine, checkfirst=True)
 
 app.include_router(user_router)
 app.include_router(essay_router)
 app.include_router(write_essay_router)
+app.include_router(metrics_router)
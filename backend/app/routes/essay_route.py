@@ -1,66 +1,134 @@
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, status
+from fastapi import (
+    APIRouter,
+    Depends,
+    Header,
+    HTTPException,
+    Query,
+    Response,
+    UploadFile,
+    status,
+)
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from ..database.entities import EssayProcessingStatus, User
+from ..config import settings
+from ..database.database import get_async_db
 from ..dependencies import get_current_user
 from ..schemas.inSchemas import EssayDetailRequest
-from ..schemas.outSchemas import EssayDetailResponse, EssayResponse, EssayStatusResponse
+from ..schemas.outSchemas import (
+    EssayProcessingStatusResponse,
+    EssayResponse,
+    EssayStatusResponse,
+)
 from ..services.essay_services import (
     EssayAlreadyExistsError,
+    essay_status_etag,
     get_essay_detail,
     get_essays_by_user,
     starting_essay_processing,
+    stream_essay_progress,
+    wait_for_essay_status_change,
 )
-from ..services.helpers.files_services import save_pdf
+from ..services.helpers.files_services import (
+    FileTooLargeError,
+    remove_file,
+    save_pdf,
+)
+from ..services.helpers.pdf_services import PdfExtractionError, PdfLimitError
+from ..services.user_services import UserSnapshot
 
 router = APIRouter(prefix="/essay", tags=["essay"])
 
 ALLOWED_MIME_TYPES = {"application/pdf"}
 
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
 
 @router.get("/all", response_model=list[EssayResponse])
-def get_essays(user: User = Depends(get_current_user)):
-    return [
-        EssayResponse.model_validate(row["essay"]).model_copy(
-            update={"analysis_status": row["analysis_status"]}
-        )
-        for row in get_essays_by_user(user.id)
-    ]
+async def get_essays(
+    response: Response,
+    cursor: int | None = Query(default=None, ge=1),
+    limit: int = Query(default=DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    user: UserSnapshot = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db),
+):
+    essays, next_cursor = await get_essays_by_user(db, user.id, limit, cursor)
+    if next_cursor is not None:
+        response.headers[NEXT_CURSOR_HEADER] = str(next_cursor)
+    return [EssayResponse(**essay) for essay in essays]
 
 
 @router.post("/detail", response_model=EssayStatusResponse)
-def get_essay(body: EssayDetailRequest, user: User = Depends(get_current_user)):
-    detail = get_essay_detail(body.essay_id, user.id)
+async def get_essay(
+    body: EssayDetailRequest,
+    user: UserSnapshot = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db),
+):
+    detail = await get_essay_detail(db, body.essay_id, user.id)
     if not detail:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Essay not found",
         )
+    return Response(content=detail, media_type="application/json")
+
 
-    processing_status = detail["processing_status"]
-
-    if processing_status != EssayProcessingStatus.COMPLETED:
-        return EssayStatusResponse(processing_status=processing_status)
-
-    essay = detail["essay"]
-    return EssayStatusResponse(
-        processing_status=processing_status,
-        detail=EssayDetailResponse(
-            id=essay.id,
-            title=essay.title,
-            cerf_level_grade=essay.cerf_level_grade,
-            original_content=essay.original_content,
-            analyzed_content=essay.analyzed_content,
-            created_at=essay.created_at,
-            analysis=detail["analysis"],
-            feedback_items=detail["feedback_items"],
-        ),
+@router.get("/events")
+async def get_essay_events(
+    user: UserSnapshot = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db),
+):
+    """
+    Server-sent events of the user's essays moving through processing,
+    with each stage's results as soon as they are stored.
+    """
+    # The stream opens its own short sessions, so do not hold this one.
+    await db.close()
+    return StreamingResponse(
+        stream_essay_progress(user.id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
     )
 
 
+@router.get("/{essay_id}/status", response_model=EssayProcessingStatusResponse)
+async def get_essay_status(
+    essay_id: int,
+    response: Response,
+    wait: float = Query(default=0, ge=0, le=settings.essay_status_max_wait_seconds),
+    if_none_match: str | None = Header(default=None),
+    user: UserSnapshot = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db),
+):
+    """
+    Processing status of one essay. Send the last ETag in If-None-Match to
+    get 304 while it is unchanged, and `wait` to long-poll until it changes.
+    """
+    essay_status = await wait_for_essay_status_change(
+        db, essay_id, user.id, if_none_match, wait
+    )
+    if not essay_status:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Essay not found",
+        )
+
+    etag = essay_status_etag(essay_status)
+    if etag == if_none_match:
+        return Response(
+            status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag}
+        )
+    response.headers["ETag"] = etag
+    return essay_status
+
+
 @router.post("/pdf")
 async def create_essay_pdf(
     file: UploadFile,
-    user: User = Depends(get_current_user),
+    user: UserSnapshot = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db),
 ):
     if file.content_type not in ALLOWED_MIME_TYPES:
         raise HTTPException(
@@ -68,20 +136,41 @@ async def create_essay_pdf(
             detail=f"Only PDF files allowed. Got: {file.content_type}",
         )
 
-    file_path = save_pdf(file.file, user.uuid)
     try:
-        essay_processing_entry = starting_essay_processing(user.id, file_path)
+        file_path = await save_pdf(file.file, user.uuid)
+    except FileTooLargeError as e:
+        raise HTTPException(
+            status_code=status.HTTP_413_CONTENT_TOO_LARGE,
+            detail=str(e),
+        ) from e
+    try:
+        essay_processing_entry = await starting_essay_processing(
+            db, user.id, user.target_cefr_level, file_path
+        )
     except EssayAlreadyExistsError as e:
+        remove_file(file_path)
         raise HTTPException(
             status_code=status.HTTP_409_CONFLICT,
             detail=str(e),
         ) from e
+    except PdfLimitError as e:
+        remove_file(file_path)
+        raise HTTPException(
+            status_code=status.HTTP_413_CONTENT_TOO_LARGE,
+            detail=str(e),
+        ) from e
+    except PdfExtractionError as e:
+        remove_file(file_path)
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_CONTENT,
+            detail=str(e),
+        ) from e
 
     return {"process_id": essay_processing_entry}
 
 
 @router.post("/new")
-def create_essay_text(
-    user: User = Depends(get_current_user),
+async def create_essay_text(
+    user: UserSnapshot = Depends(get_current_user),
 ):
     pass
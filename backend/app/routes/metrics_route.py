@@ -0,0 +1,36 @@
+from fastapi import APIRouter, Depends
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..database.database import get_async_db
+from ..database.pool_metrics import get_pool_stats
+from ..dependencies import require_metrics_token
+from ..jobs.notification_outbox_job import get_outbox_stats
+from ..llm.json_stream import get_stream_stats
+from ..llm.response_cache import get_cache_stats
+from ..services.essay_services import essay_detail_cache
+from ..services.notification_service import get_outbox_backlog, get_push_stats
+from ..services.queue_event_hub import subscriber_counts
+from ..services.user_services import get_user_cache_stats
+
+router = APIRouter(
+    prefix="/metrics",
+    tags=["metrics"],
+    dependencies=[Depends(require_metrics_token)],
+)
+
+
+@router.get("")
+async def get_metrics(db: AsyncSession = Depends(get_async_db)):
+    return {
+        "db_pools": get_pool_stats(),
+        "llm_cache": get_cache_stats(),
+        "llm_streams": get_stream_stats(),
+        "user_cache": get_user_cache_stats(),
+        "essay_detail_cache": essay_detail_cache.stats(),
+        "push_notifications": get_push_stats(),
+        "notification_outbox": {
+            **get_outbox_stats(),
+            **await get_outbox_backlog(db),
+        },
+        "subscribers": subscriber_counts(),
+    }
@@ -1,5 +1,7 @@
 from fastapi import APIRouter, Depends, HTTPException, status
+from sqlalchemy.ext.asyncio import AsyncSession
 
+from ..database.database import get_async_db
 from ..dependencies import get_uuid_header
 from ..schemas.inSchemas import UserCreate, UserLogin, UserUpdate
 from ..schemas.outSchemas import UserResponse, UserResponseNoUuid
@@ -14,12 +16,13 @@ router = APIRouter(prefix="/users", tags=["user"])
 
 
 @router.post("/new", response_model=UserResponse, status_code=status.HTTP_201_CREATED)
-def create_user_route(
+async def create_user_route(
     body: UserCreate,
     uuid: str = Depends(get_uuid_header),
+    db: AsyncSession = Depends(get_async_db),
 ):
     try:
-        user = create_user(uuid=uuid, **body.model_dump(exclude_none=True))
+        user = await create_user(db, uuid=uuid, **body.model_dump(exclude_none=True))
     except UserAlreadyExistsError as e:
         raise HTTPException(
             status_code=status.HTTP_409_CONFLICT,
@@ -30,11 +33,12 @@ def create_user_route(
 
 
 @router.patch("/update", response_model=UserResponseNoUuid)
-def update_user_route(
+async def update_user_route(
     body: UserUpdate,
     uuid: str = Depends(get_uuid_header),
+    db: AsyncSession = Depends(get_async_db),
 ):
-    user = update_user(uuid=uuid, **body.model_dump(exclude_none=True))
+    user = await update_user(db, uuid=uuid, **body.model_dump(exclude_none=True))
     if user is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -44,8 +48,12 @@ def update_user_route(
 
 
 @router.post("/login", response_model=UserResponse)
-def login_user_route(body: UserLogin, uuid: str = Depends(get_uuid_header)):
-    user = get_user_by_uuid(uuid)
+async def login_user_route(
+    body: UserLogin,
+    uuid: str = Depends(get_uuid_header),
+    db: AsyncSession = Depends(get_async_db),
+):
+    user = await get_user_by_uuid(db, uuid)
     if user is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -1,12 +1,14 @@
 from fastapi import APIRouter, Depends, HTTPException, status
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from ..database.entities import User
+from ..database.database import get_async_db
 from ..dependencies import get_current_user
 from ..schemas.inSchemas import (
     WriteEssayDraftCreateRequest,
     WriteEssayDraftUpdateRequest,
 )
 from ..schemas.outSchemas import WriteEssayDraftResponse
+from ..services.user_services import UserSnapshot
 from ..services.write_essay_services import (
     create_draft,
     delete_draft,
@@ -21,20 +23,29 @@ router = APIRouter(prefix="/write-essay", tags=["write-essay"])
 @router.post(
     "/new", response_model=WriteEssayDraftResponse, status_code=status.HTTP_201_CREATED
 )
-def create_write_essay_draft(
-    body: WriteEssayDraftCreateRequest, user: User = Depends(get_current_user)
+async def create_write_essay_draft(
+    body: WriteEssayDraftCreateRequest,
+    user: UserSnapshot = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db),
 ):
-    return create_draft(user.id, body.title, body.content)
+    return await create_draft(db, user.id, body.title, body.content)
 
 
 @router.get("/all", response_model=list[WriteEssayDraftResponse])
-def get_write_essay_drafts(user: User = Depends(get_current_user)):
-    return get_drafts_by_user(user.id)
+async def get_write_essay_drafts(
+    user: UserSnapshot = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db),
+):
+    return await get_drafts_by_user(db, user.id)
 
 
 @router.get("/{draft_id}", response_model=WriteEssayDraftResponse)
-def get_write_essay_draft(draft_id: int, user: User = Depends(get_current_user)):
-    draft = get_draft_by_id(draft_id, user.id)
+async def get_write_essay_draft(
+    draft_id: int,
+    user: UserSnapshot = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db),
+):
+    draft = await get_draft_by_id(db, draft_id, user.id)
     if not draft:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND, detail="Draft not found"
@@ -43,12 +54,13 @@ def get_write_essay_draft(draft_id: int, user: User = Depends(get_current_user))
 
 
 @router.patch("/{draft_id}", response_model=WriteEssayDraftResponse)
-def update_write_essay_draft(
+async def update_write_essay_draft(
     draft_id: int,
     body: WriteEssayDraftUpdateRequest,
-    user: User = Depends(get_current_user),
+    user: UserSnapshot = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db),
 ):
-    draft = update_draft(draft_id, user.id, body.title, body.content)
+    draft = await update_draft(db, draft_id, user.id, body.title, body.content)
     if not draft:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND, detail="Draft not found"
@@ -57,9 +69,13 @@ def update_write_essay_draft(
 
 
 @router.delete("/{draft_id}", status_code=status.HTTP_204_NO_CONTENT)
-def delete_write_essay_draft(draft_id: int, user: User = Depends(get_current_user)):
-    draft = delete_draft(draft_id, user.id)
-    if not draft:
+async def delete_write_essay_draft(
+    draft_id: int,
+    user: UserSnapshot = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db),
+):
+    deleted_id = await delete_draft(db, draft_id, user.id)
+    if not deleted_id:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND, detail="Draft not found"
         )
@@ -46,6 +46,12 @@ class EssayStatusResponse(BaseModel):
     detail: EssayDetailResponse | None = None
 
 
+class EssayProcessingStatusResponse(BaseModel):
+    essay_id: int
+    processing_status: str | None
+    analysis_status: AnalysisStatus
+
+
 class UserResponse(BaseModel):
     id: int
     username: str
@@ -1,15 +1,65 @@
-from ..database.database import get_db
+import asyncio
+import json
+from collections.abc import AsyncIterator
+from contextlib import suppress
+
+from sqlalchemy import (
+    ColumnElement,
+    ScalarSelect,
+    Select,
+    func,
+    insert,
+    literal,
+    select,
+)
+from sqlalchemy.dialects.postgresql import aggregate_order_by
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..config import settings
+from ..database.async_helpers import single_entry_to_db, update_by_id
+from ..database.blob_store import (
+    blob_data,
+    decompress_text,
+    prepare_blob,
+    replace_blob,
+    retain_blobs,
+    store_blob,
+)
+from ..database.database import AsyncSessionLocal
 from ..database.entities import (
+    AnalysisCategory,
     AnalysisStatus,
+    Confidence,
     Essay,
     EssayAnalysis,
+    EssayProcessingArchive,
     EssayProcessingQueue,
     EssayProcessingStatus,
     FeedbackItem,
+    FeedbackOrigin,
+)
+from ..schemas.outSchemas import (
+    EssayAnalysisResponse,
+    EssayDetailResponse,
+    EssayProcessingStatusResponse,
+    EssayStatusResponse,
+    FeedbackItemResponse,
+)
+from .helpers.files_services import run_file_task
+from .helpers.pdf_services import extract_text_from_pdf
+from .helpers.text_extractors import content_fingerprint, extract_email_subject
+from .helpers.ttl_cache import TtlCache
+from .notification_service import enqueue_push_notification
+from .queue_event_hub import subscribe_to_essay, subscribe_to_user
+from .queue_events import ProcessingStage, publish_queue_event_async
+
+SSE_RETRY_MILLISECONDS = 3000
+
+essay_detail_cache: TtlCache[tuple[int, int], bytes] = TtlCache(
+    settings.essay_detail_cache_max_entries,
+    settings.essay_detail_cache_ttl_seconds,
 )
-from ..database.helpers import single_entry_to_db, update_by_id
-from .helpers.files_services import extract_text_from_pdf
-from .helpers.text_extractors import extract_email_subject
 
 
 def to_analysis_status(status: EssayProcessingStatus | None) -> AnalysisStatus:
@@ -31,71 +81,428 @@ class EssayAlreadyExistsError(Exception):
         super().__init__(f"Essay with id {essay_id} already exists for this user")
 
 
-def get_essay_detail(essay_id: int, user_id: int) -> dict | None:
-    with get_db() as db:
-        essay = (
-            db.query(Essay)
-            .filter(Essay.id == essay_id, Essay.user_id == user_id)
-            .first()
+def latest_processing_status(essay_id: ColumnElement[int]) -> ColumnElement:
+    """
+    Correlated lookup of the newest queue status of `essay_id`, so only the
+    queue rows of the essays being read are touched. Entries still in the
+    queue are always newer than archived ones, so the archive is only read
+    for essays with nothing left in the queue.
+    """
+    return func.coalesce(
+        _newest_status(EssayProcessingQueue, essay_id),
+        _newest_status(EssayProcessingArchive, essay_id),
+    )
+
+
+def _newest_status(
+    model: type[EssayProcessingQueue] | type[EssayProcessingArchive],
+    essay_id: ColumnElement[int],
+) -> ScalarSelect:
+    return (
+        select(model.status)
+        .where(model.essay_id == essay_id)
+        .order_by(model.created_at.desc(), model.id.desc())
+        .limit(1)
+        .scalar_subquery()
+    )
+
+
+def _analysis_json(essay_id: ColumnElement[int]) -> ScalarSelect:
+    return (
+        select(
+            func.json_build_object(
+                "id",
+                EssayAnalysis.id,
+                "analysis_result",
+                EssayAnalysis.analysis_result,
+                "confidence",
+                EssayAnalysis.confidence,
+                "recommendations",
+                EssayAnalysis.recommendations,
+            )
         )
-        if not essay:
-            return None
-        queue_entry = (
-            db.query(EssayProcessingQueue)
-            .filter(EssayProcessingQueue.essay_id == essay_id)
-            .order_by(EssayProcessingQueue.created_at.desc())
-            .first()
+        .where(EssayAnalysis.essay_id == essay_id)
+        .order_by(EssayAnalysis.id)
+        .limit(1)
+        .scalar_subquery()
+    )
+
+
+def _feedback_items_json(essay_id: ColumnElement[int]) -> ScalarSelect:
+    return (
+        select(
+            func.json_agg(
+                aggregate_order_by(
+                    func.json_build_object(
+                        "id",
+                        FeedbackItem.id,
+                        "feedback_origin",
+                        FeedbackItem.feedback_origin,
+                        "category",
+                        FeedbackItem.category,
+                        "short_mistake_summary",
+                        FeedbackItem.short_mistake_summary,
+                        "comments",
+                        FeedbackItem.comments,
+                    ),
+                    FeedbackItem.id,
+                )
+            )
         )
-        analysis = (
-            db.query(EssayAnalysis).filter(EssayAnalysis.essay_id == essay_id).first()
+        .where(FeedbackItem.essay_id == essay_id)
+        .scalar_subquery()
+    )
+
+
+# json_build_object sees the enum names Postgres stores, not our values.
+def _analysis_from_json(analysis: dict | None) -> EssayAnalysisResponse | None:
+    if not analysis:
+        return None
+    return EssayAnalysisResponse(
+        **{**analysis, "confidence": Confidence[analysis["confidence"]]}
+    )
+
+
+def _feedback_items_from_json(items: list[dict] | None) -> list[FeedbackItemResponse]:
+    return [
+        FeedbackItemResponse(
+            **{
+                **item,
+                "feedback_origin": FeedbackOrigin[item["feedback_origin"]],
+                "category": AnalysisCategory[item["category"]],
+            }
         )
-        feedback_items = (
-            db.query(FeedbackItem).filter(FeedbackItem.essay_id == essay_id).all()
+        for item in items or []
+    ]
+
+
+def essay_detail_query(essay_id: int, user_id: int) -> Select:
+    return select(
+        Essay.id,
+        Essay.title,
+        Essay.cerf_level_grade,
+        blob_data(Essay.original_content_sha256).label("original_content"),
+        blob_data(Essay.analyzed_content_sha256).label("analyzed_content"),
+        Essay.created_at,
+        latest_processing_status(Essay.id).label("processing_status"),
+        _analysis_json(Essay.id).label("analysis"),
+        _feedback_items_json(Essay.id).label("feedback_items"),
+    ).where(Essay.id == essay_id, Essay.user_id == user_id)
+
+
+async def load_essay_detail(
+    db: AsyncSession, essay_id: int, user_id: int
+) -> EssayStatusResponse | None:
+    """
+    Load the essay, its latest status, analysis and feedback items in one
+    query, the last two aggregated to JSON by Postgres.
+    """
+    row = (await db.execute(essay_detail_query(essay_id, user_id))).first()
+    if not row:
+        return None
+    if row.processing_status != EssayProcessingStatus.COMPLETED:
+        return EssayStatusResponse(processing_status=row.processing_status)
+
+    return EssayStatusResponse(
+        processing_status=row.processing_status,
+        detail=EssayDetailResponse(
+            id=row.id,
+            title=row.title,
+            cerf_level_grade=row.cerf_level_grade,
+            original_content=decompress_text(row.original_content),
+            analyzed_content=decompress_text(row.analyzed_content),
+            created_at=row.created_at,
+            analysis=_analysis_from_json(row.analysis),
+            feedback_items=_feedback_items_from_json(row.feedback_items),
+        ),
+    )
+
+
+async def get_essay_detail(
+    db: AsyncSession, essay_id: int, user_id: int
+) -> bytes | None:
+    """
+    Serialized essay detail. Completed essays do not change until they are
+    processed again, so their detail is cached until a queue event for the
+    essay arrives.
+    """
+    key = (essay_id, user_id)
+    if cached := essay_detail_cache.get(key):
+        return cached
+
+    detail = await load_essay_detail(db, essay_id, user_id)
+    if detail is None:
+        return None
+    serialized = detail.model_dump_json().encode()
+    if detail.detail is not None:
+        essay_detail_cache.set(key, serialized)
+    return serialized
+
+
+def invalidate_essay_detail(event: dict) -> None:
+    if event["essay_id"] is not None:
+        essay_detail_cache.pop((event["essay_id"], event["user_id"]))
+
+
+async def get_essay_processing_status(
+    db: AsyncSession, essay_id: int, user_id: int
+) -> EssayProcessingStatusResponse | None:
+    row = (
+        await db.execute(
+            select(latest_processing_status(Essay.id)).where(
+                Essay.id == essay_id, Essay.user_id == user_id
+            )
         )
-        return {
-            "essay": essay,
-            "processing_status": queue_entry.status if queue_entry else None,
-            "analysis": analysis,
-            "feedback_items": feedback_items,
-        }
+    ).first()
+    if not row:
+        return None
+    return EssayProcessingStatusResponse(
+        essay_id=essay_id,
+        processing_status=row[0],
+        analysis_status=to_analysis_status(row[0]),
+    )
+
+
+def essay_status_etag(essay_status: EssayProcessingStatusResponse) -> str:
+    return f'"{essay_status.processing_status or "none"}"'
 
 
-def get_essays_by_user(user_id: int) -> list[dict]:
-    with get_db() as db:
-        latest_queue = (
-            db.query(
-                EssayProcessingQueue.essay_id,
-                EssayProcessingQueue.status,
+async def wait_for_essay_status_change(
+    db: AsyncSession, essay_id: int, user_id: int, etag: str | None, wait: float
+) -> EssayProcessingStatusResponse | None:
+    """
+    Current status of the essay. If it still matches `etag`, hold on for up
+    to `wait` seconds until a queue event for the essay arrives from any
+    replica, then read it again.
+    """
+    with subscribe_to_essay(essay_id) as changed:
+        essay_status = await get_essay_processing_status(db, essay_id, user_id)
+        if not essay_status or not wait or essay_status_etag(essay_status) != etag:
+            return essay_status
+
+        # End the read transaction so the connection is not held while waiting.
+        await db.rollback()
+        with suppress(TimeoutError):
+            async with asyncio.timeout(wait):
+                await changed.wait()
+    return await get_essay_processing_status(db, essay_id, user_id)
+
+
+async def load_essay_progress(db: AsyncSession, event: dict) -> list[tuple[str, dict]]:
+    """
+    Turn a queue event into the server-sent events for it: the new status,
+    and the results of the stage that was just stored, if any.
+    """
+    essay_id, processing_status = event["essay_id"], event["status"]
+    progress = [
+        (
+            "status",
+            {
+                "essay_id": essay_id,
+                "processing_status": processing_status,
+                "analysis_status": to_analysis_status(processing_status),
+            },
+        )
+    ]
+    match event.get("stage"):
+        case ProcessingStage.EXTRACTION:
+            row = (
+                await db.execute(
+                    select(
+                        blob_data(Essay.original_content_sha256),
+                        blob_data(Essay.analyzed_content_sha256),
+                    ).where(Essay.id == essay_id)
+                )
+            ).one()
+            progress.append(
+                (
+                    "extraction",
+                    {
+                        "essay_id": essay_id,
+                        "original_content": decompress_text(row[0]),
+                        "analyzed_content": decompress_text(row[1]),
+                    },
+                )
             )
-            .distinct(EssayProcessingQueue.essay_id)
-            .order_by(
-                EssayProcessingQueue.essay_id,
-                EssayProcessingQueue.created_at.desc(),
+        case ProcessingStage.CEFR:
+            row = (
+                await db.execute(
+                    select(
+                        Essay.cerf_level_grade,
+                        _analysis_json(Essay.id).label("analysis"),
+                    ).where(Essay.id == essay_id)
+                )
+            ).one()
+            analysis = _analysis_from_json(row.analysis)
+            progress.append(
+                (
+                    "cefr",
+                    {
+                        "essay_id": essay_id,
+                        "cerf_level_grade": row.cerf_level_grade,
+                        "analysis": analysis.model_dump() if analysis else None,
+                    },
+                )
             )
-            .subquery()
+        case ProcessingStage.FEEDBACK:
+            items = await db.scalar(select(_feedback_items_json(essay_id)))
+            progress.append(
+                (
+                    "feedback",
+                    {
+                        "essay_id": essay_id,
+                        "feedback_items": [
+                            item.model_dump()
+                            for item in _feedback_items_from_json(items)
+                        ],
+                    },
+                )
+            )
+    return progress
+
+
+async def stream_essay_progress(user_id: int) -> AsyncIterator[str]:
+    """
+    Server-sent events for every status change and stored stage result of
+    the user's essays, with a comment every few seconds to keep the
+    connection open.
+    """
+    last_statuses: dict[int, str] = {}
+    with subscribe_to_user(user_id) as events:
+        yield f"retry: {SSE_RETRY_MILLISECONDS}\n\n"
+        while True:
+            try:
+                async with asyncio.timeout(settings.essay_events_keepalive_seconds):
+                    event = await events.get()
+            except TimeoutError:
+                yield ": keep-alive\n\n"
+                continue
+            if event["essay_id"] is None:
+                continue
+            async with AsyncSessionLocal() as db:
+                progress = await load_essay_progress(db, event)
+            for name, data in progress:
+                if name == "status":
+                    if last_statuses.get(data["essay_id"]) == data["processing_status"]:
+                        continue
+                    last_statuses[data["essay_id"]] = data["processing_status"]
+                yield f"event: {name}\ndata: {json.dumps(data, default=str)}\n\n"
+
+
+def essay_page_query(user_id: int, limit: int, cursor: int | None = None) -> Select:
+    query = (
+        select(
+            Essay.id,
+            Essay.title,
+            Essay.cerf_level_grade,
+            Essay.created_at,
+            latest_processing_status(Essay.id).label("processing_status"),
         )
-        rows = (
-            db.query(Essay, latest_queue.c.status)
-            .outerjoin(latest_queue, Essay.id == latest_queue.c.essay_id)
-            .filter(Essay.user_id == user_id)
-            .all()
+        .where(Essay.user_id == user_id)
+        .order_by(Essay.id.desc())
+        # One extra row tells whether another page follows.
+        .limit(limit + 1)
+    )
+    if cursor is not None:
+        query = query.where(Essay.id < cursor)
+    return query
+
+
+async def get_essays_by_user(
+    db: AsyncSession, user_id: int, limit: int, cursor: int | None = None
+) -> tuple[list[dict], int | None]:
+    """
+    One page of the user's essays, newest first, without the essay texts.
+    Pass the returned cursor back to get the next page; it is None on the
+    last one.
+    """
+    rows = (await db.execute(essay_page_query(user_id, limit, cursor))).all()
+    next_cursor = rows[limit - 1].id if len(rows) > limit else None
+    return [
+        {
+            "id": row.id,
+            "title": row.title,
+            "cerf_level_grade": row.cerf_level_grade,
+            "created_at": row.created_at,
+            "analysis_status": to_analysis_status(row.processing_status),
+        }
+        for row in rows[:limit]
+    ], next_cursor
+
+
+async def get_essay_by_title_and_user(
+    db: AsyncSession, essay_title: str, user_id: int
+) -> Essay | None:
+    return await db.scalar(
+        select(Essay).where(Essay.title == essay_title, Essay.user_id == user_id)
+    )
+
+
+def processed_essay_query(fingerprint: str, target_cefr_level: str) -> Select:
+    """
+    The newest fully processed essay with the same content, graded for the
+    same target level.
+    """
+    return (
+        select(Essay)
+        .where(
+            Essay.content_fingerprint == fingerprint,
+            Essay.target_cefr_level == target_cefr_level,
+            latest_processing_status(Essay.id) == EssayProcessingStatus.COMPLETED,
         )
-        return [
-            {"essay": essay, "analysis_status": to_analysis_status(status)}
-            for essay, status in rows
-        ]
-
-
-def get_essay_by_title_and_user(essay_title: str, user_id: int) -> Essay | None:
-    with get_db() as db:
-        return (
-            db.query(Essay)
-            .filter(Essay.title == essay_title, Essay.user_id == user_id)
-            .first()
+        .order_by(Essay.id.desc())
+        .limit(1)
+    )
+
+
+async def reuse_essay_results(db: AsyncSession, source: Essay, essay: Essay) -> None:
+    """
+    Give `essay` the extracted texts, grade, analysis and feedback items of
+    `source`, an already processed essay with the same content.
+    """
+    await db.run_sync(
+        retain_blobs, [source.original_content_sha256, source.analyzed_content_sha256]
+    )
+    essay.original_content_sha256 = source.original_content_sha256
+    essay.analyzed_content_sha256 = source.analyzed_content_sha256
+    essay.cerf_level_grade = source.cerf_level_grade
+    await db.execute(
+        insert(EssayAnalysis).from_select(
+            ["user_id", "essay_id", "analysis_result", "confidence", "recommendations"],
+            select(
+                literal(essay.user_id),
+                literal(essay.id),
+                EssayAnalysis.analysis_result,
+                EssayAnalysis.confidence,
+                EssayAnalysis.recommendations,
+            ).where(EssayAnalysis.essay_id == source.id),
         )
+    )
+    await db.execute(
+        insert(FeedbackItem).from_select(
+            [
+                "user_id",
+                "essay_id",
+                "feedback_origin",
+                "category",
+                "short_mistake_summary",
+                "comments",
+            ],
+            select(
+                literal(essay.user_id),
+                literal(essay.id),
+                FeedbackItem.feedback_origin,
+                FeedbackItem.category,
+                FeedbackItem.short_mistake_summary,
+                FeedbackItem.comments,
+            ).where(FeedbackItem.essay_id == source.id),
+        )
+    )
+    await db.flush()
 
 
-def create_or_update_essay(
+async def create_or_update_essay(
+    db: AsyncSession,
     user_id: int,
     title: str,
     original_content: str | None = None,
@@ -103,67 +510,142 @@ def create_or_update_essay(
     cerf_level_grade: str | None = None,
     document_path: str | None = None,
     essay_id: int | None = None,
+    target_cefr_level: str | None = None,
+    fingerprint: str | None = None,
 ) -> Essay:
+    # Compressed on the file pool; run_sync would run it on the event loop.
+    original_blob = await run_file_task(prepare_blob, original_content)
+    analyzed_blob = await run_file_task(prepare_blob, analyzed_content)
     if essay_id:
-        essay = update_by_id(
+        essay = await db.get(Essay, essay_id)
+        if not essay:
+            raise ValueError(f"Essay with id {essay_id} not found for user {user_id}")
+        return await update_by_id(
+            db,
             Essay,
             essay_id,
             {
                 "title": title,
-                "original_content": original_content,
-                "analyzed_content": analyzed_content,
+                "original_content_sha256": await db.run_sync(
+                    replace_blob, essay.original_content_sha256, original_blob
+                ),
+                "analyzed_content_sha256": await db.run_sync(
+                    replace_blob, essay.analyzed_content_sha256, analyzed_blob
+                ),
                 "cerf_level_grade": cerf_level_grade,
                 "document_path": document_path,
             },
         )
-        if not essay:
-            raise ValueError(f"Essay with id {essay_id} not found for user {user_id}")
-        return essay
 
-    existing_essay = get_essay_by_title_and_user(essay_title=title, user_id=user_id)
+    existing_essay = await get_essay_by_title_and_user(
+        db, essay_title=title, user_id=user_id
+    )
     if existing_essay:
         raise EssayAlreadyExistsError(essay_id=existing_essay.id, user_id=user_id)
-    return single_entry_to_db(
+    return await single_entry_to_db(
+        db,
         Essay,
         {
             "user_id": user_id,
             "title": title,
-            "original_content": original_content,
-            "analyzed_content": analyzed_content,
+            "original_content_sha256": await db.run_sync(store_blob, original_blob),
+            "analyzed_content_sha256": await db.run_sync(store_blob, analyzed_blob),
             "cerf_level_grade": cerf_level_grade,
+            "target_cefr_level": target_cefr_level,
+            "content_fingerprint": fingerprint,
             "document_path": document_path,
         },
     )
 
 
-def register_essay_for_processing(
+async def register_essay_for_processing(
+    db: AsyncSession,
     user_id: int,
     essay_id: int | None,
     raw_content: str,
     document_path: str | None = None,
+    status: EssayProcessingStatus = EssayProcessingStatus.PENDING,
 ):
-    return single_entry_to_db(
+    raw_blob = await run_file_task(prepare_blob, raw_content)
+    entry = await single_entry_to_db(
+        db,
         EssayProcessingQueue,
         {
             "user_id": user_id,
             "essay_id": essay_id,
-            "status": EssayProcessingStatus.PENDING,
-            "raw_content": raw_content,
+            "status": status,
+            "raw_content_sha256": await db.run_sync(store_blob, raw_blob),
             "document_path": document_path,
         },
     )
+    await publish_queue_event_async(db, entry)
+    return entry
 
 
-def starting_essay_processing(user_id: int, file_path: str):
-    file_content = extract_text_from_pdf(file_path)
-    essay_title = extract_email_subject(file_content)
-    essay = create_or_update_essay(
-        user_id=user_id, title=essay_title, document_path=file_path
+async def _own_copy_id(db: AsyncSession, user_id: int, fingerprint: str) -> int | None:
+    return await db.scalar(
+        select(Essay.id).where(
+            Essay.content_fingerprint == fingerprint, Essay.user_id == user_id
+        )
     )
-    essay_process = register_essay_for_processing(
+
+
+async def starting_essay_processing(
+    db: AsyncSession, user_id: int, target_cefr_level: str | None, file_path: str
+):
+    """
+    Create the essay for an uploaded thread and queue it. A thread the user
+    already uploaded raises EssayAlreadyExistsError. A thread someone has
+    already had processed for the same target level reuses those results
+    and is queued as completed, without asking the LLM again.
+    """
+    file_content = await extract_text_from_pdf(file_path)
+    essay_title = extract_email_subject(file_content)
+    fingerprint = content_fingerprint(file_content)
+    own_copy = await _own_copy_id(db, user_id, fingerprint)
+    if own_copy:
+        raise EssayAlreadyExistsError(essay_id=own_copy, user_id=user_id)
+
+    try:
+        essay = await create_or_update_essay(
+            db,
+            user_id=user_id,
+            title=essay_title,
+            document_path=file_path,
+            target_cefr_level=target_cefr_level,
+            fingerprint=fingerprint,
+        )
+    except IntegrityError as e:
+        # A concurrent upload of the same thread committed first.
+        await db.rollback()
+        own_copy = await _own_copy_id(db, user_id, fingerprint)
+        if own_copy is None:
+            raise
+        raise EssayAlreadyExistsError(essay_id=own_copy, user_id=user_id) from e
+    processed = None
+    if target_cefr_level:
+        processed = await db.scalar(
+            processed_essay_query(fingerprint, target_cefr_level)
+        )
+    if processed:
+        await reuse_essay_results(db, processed, essay)
+        await db.run_sync(
+            enqueue_push_notification,
+            user_id,
+            title="Essay Ready",
+            body="Your essay has been analysed.",
+            data={"essay_id": essay.id},
+        )
+    essay_process = await register_essay_for_processing(
+        db,
         user_id=user_id,
         essay_id=essay.id,
         raw_content=file_content,
         document_path=file_path,
+        status=EssayProcessingStatus.COMPLETED
+        if processed
+        else EssayProcessingStatus.PENDING,
     )
+    # The essay, its queue entry and the queue notification commit together.
+    await db.commit()
     return essay_process.id
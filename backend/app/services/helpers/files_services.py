@@ -1,20 +1,55 @@
+import asyncio
 import secrets
+from collections.abc import Callable
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
+from typing import BinaryIO
 
-import pymupdf
+from ...config import settings
 
 PDF_DIR = Path("/app/email_pdfs")
 
+# Bounded pool for blocking file work, so uploads never run it on
+# the event loop and cannot start more of it than the pool allows.
+_file_executor = ThreadPoolExecutor(
+    max_workers=settings.file_worker_count, thread_name_prefix="files"
+)
 
-def save_pdf(file: any, user_uuid: str) -> str:
-    PDF_DIR.mkdir(parents=True, exist_ok=True)
 
+class FileTooLargeError(Exception):
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        super().__init__(f"File is larger than the {max_bytes} byte limit")
+
+
+async def run_file_task[T](func: Callable[..., T], *args: object) -> T:
+    return await asyncio.get_running_loop().run_in_executor(_file_executor, func, *args)
+
+
+def _copy_limited(source: BinaryIO, file_path: Path, max_bytes: int) -> None:
+    file_path.parent.mkdir(parents=True, exist_ok=True)
+    written = 0
+    try:
+        with file_path.open("wb") as f:
+            while chunk := source.read(settings.upload_chunk_bytes):
+                written += len(chunk)
+                if written > max_bytes:
+                    raise FileTooLargeError(max_bytes)
+                f.write(chunk)
+    except BaseException:
+        file_path.unlink(missing_ok=True)
+        raise
+
+
+async def save_pdf(file: BinaryIO, user_uuid: str) -> str:
+    """
+    Copy an upload to disk in chunks on the file pool. Uploads over
+    `pdf_max_upload_bytes` raise FileTooLargeError and leave nothing behind.
+    """
     filename = f"{user_uuid}_{secrets.token_hex(8)}.pdf"
     file_path = PDF_DIR / filename
 
-    with file_path.open("wb") as f:
-        f.write(file.read())
-
+    await run_file_task(_copy_limited, file, file_path, settings.pdf_max_upload_bytes)
     return str(file_path)
 
 
@@ -24,9 +59,5 @@ def remove_file(file_path: str):
         path.unlink()
 
 
-def extract_text_from_pdf(file_path: str) -> str:
-    doc = pymupdf.open(file_path)
-    text = ""
-    for page in doc:
-        text += page.get_text()
-    return text
+def shutdown_file_pool() -> None:
+    _file_executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,130 @@
+import asyncio
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from pathlib import Path
+from threading import Lock
+
+import pymupdf
+
+from ...config import settings
+
+# Created on first use. Workers are spawned rather than forked, since the
+# API process runs several threads.
+_pdf_executor: ProcessPoolExecutor | None = None
+_pdf_executor_lock = Lock()
+
+
+class PdfLimitError(Exception):
+    pass
+
+
+class PdfExtractionError(Exception):
+    pass
+
+
+def _get_pdf_executor() -> ProcessPoolExecutor:
+    global _pdf_executor  # noqa: PLW0603
+    with _pdf_executor_lock:
+        if _pdf_executor is None:
+            _pdf_executor = ProcessPoolExecutor(
+                max_workers=settings.pdf_process_count,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return _pdf_executor
+
+
+def _recycle_pdf_executor(executor: ProcessPoolExecutor) -> None:
+    """
+    Replace `executor` with a new pool on next use and terminate its
+    workers, which may still be busy with a PDF nobody waits for. Tasks
+    still running or queued on it fail with BrokenProcessPool.
+    """
+    global _pdf_executor  # noqa: PLW0603
+    with _pdf_executor_lock:
+        if _pdf_executor is executor:
+            _pdf_executor = None
+    # There is no public way to stop busy workers before Python 3.14, and
+    # terminate_workers() there cancels the queued pages of other uploads
+    # instead of failing them.
+    for process in list((executor._processes or {}).values()):
+        process.terminate()
+
+
+def count_pdf_pages(file_path: str) -> int:
+    with pymupdf.open(file_path) as doc:
+        return doc.page_count
+
+
+def extract_page_range(file_path: str, start: int, stop: int) -> str:
+    with pymupdf.open(file_path) as doc:
+        return "".join(doc[number].get_text() for number in range(start, stop))
+
+
+async def _extract_text(executor: ProcessPoolExecutor, file_path: str) -> str:
+    loop = asyncio.get_running_loop()
+    page_count = await loop.run_in_executor(executor, count_pdf_pages, file_path)
+    if page_count > settings.pdf_max_pages:
+        raise PdfLimitError(
+            f"PDF has {page_count} pages, the limit is {settings.pdf_max_pages}"
+        )
+    step = settings.pdf_pages_per_task
+    parts = await asyncio.gather(
+        *(
+            loop.run_in_executor(
+                executor,
+                extract_page_range,
+                file_path,
+                start,
+                min(start + step, page_count),
+            )
+            for start in range(0, page_count, step)
+        )
+    )
+    return "".join(parts)
+
+
+async def extract_text_from_pdf(file_path: str) -> str:
+    """
+    Extract the text of a PDF on the process pool. Documents longer than
+    `pdf_pages_per_task` are split into page ranges that are extracted in
+    parallel. Raises PdfLimitError for files over the size or page limits
+    and PdfExtractionError when the PDF cannot be read in time or crashes
+    its worker; the pool is recycled then, so later uploads are not stuck
+    behind a hung or dead worker.
+    """
+    if Path(file_path).stat().st_size > settings.pdf_max_upload_bytes:  # noqa: ASYNC240
+        raise PdfLimitError(
+            f"PDF is larger than the {settings.pdf_max_upload_bytes} byte limit"
+        )
+
+    executor = _get_pdf_executor()
+    try:
+        async with asyncio.timeout(settings.pdf_extract_timeout_seconds):
+            try:
+                return await _extract_text(executor, file_path)
+            except BrokenProcessPool:
+                # The pool may have been broken by another upload's PDF or
+                # recycled under this one, so retry once on a fresh pool.
+                _recycle_pdf_executor(executor)
+                executor = _get_pdf_executor()
+                return await _extract_text(executor, file_path)
+    except TimeoutError as e:
+        # Timing out only stops waiting; the workers are still parsing.
+        _recycle_pdf_executor(executor)
+        raise PdfExtractionError(
+            f"PDF text extraction took longer than {settings.pdf_extract_timeout_seconds}s"
+        ) from e
+    except BrokenProcessPool as e:
+        _recycle_pdf_executor(executor)
+        raise PdfExtractionError("The PDF crashed the text extractor") from e
+    except pymupdf.FileDataError as e:
+        raise PdfExtractionError("Could not read the PDF") from e
+
+
+def shutdown_pdf_pool() -> None:
+    global _pdf_executor  # noqa: PLW0603
+    with _pdf_executor_lock:
+        if _pdf_executor is not None:
+            _pdf_executor.shutdown(wait=False, cancel_futures=True)
+            _pdf_executor = None
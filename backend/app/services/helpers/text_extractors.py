@@ -1,3 +1,7 @@
+import hashlib
+import re
+import unicodedata
+
 GMAIL_SUBJECT_LINE_INDEX = 1
 MIN_LINES_FOR_SUBJECT = 2
 
@@ -13,3 +17,12 @@ def extract_email_subject(text: str) -> str | None:
         return lines[GMAIL_SUBJECT_LINE_INDEX].strip()
 
     return None
+
+
+def content_fingerprint(text: str) -> str:
+    """
+    SHA-256 of the text with Unicode forms unified and whitespace collapsed,
+    so re-exports of the same thread that only differ in layout match.
+    """
+    normalized = re.sub(r"\s+", " ", unicodedata.normalize("NFKC", text)).strip()
+    return hashlib.sha256(normalized.encode()).hexdigest()
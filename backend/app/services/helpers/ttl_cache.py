@@ -0,0 +1,51 @@
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import Hashable
+
+
+class TtlCache[K: Hashable, V]:
+    """
+    Thread-safe in-process cache that forgets entries after `ttl_seconds`
+    and drops the least recently used one once `max_entries` is reached.
+    """
+
+    def __init__(self, max_entries: int, ttl_seconds: float):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: OrderedDict[K, tuple[float, V]] = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "evictions": 0, "invalidations": 0}
+
+    def get(self, key: K) -> V | None:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                if entry is not None:
+                    del self._entries[key]
+                self._stats["misses"] += 1
+                return None
+            self._entries.move_to_end(key)
+            self._stats["hits"] += 1
+            return entry[1]
+
+    def set(self, key: K, value: V) -> None:
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl_seconds, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._stats["evictions"] += 1
+
+    def pop(self, key: K) -> None:
+        with self._lock:
+            if self._entries.pop(key, None) is not None:
+                self._stats["invalidations"] += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict[str, int]:
+        with self._lock:
+            return {**self._stats, "entries": len(self._entries)}
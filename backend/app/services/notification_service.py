@@ -1,36 +1,199 @@
-import json
+import asyncio
 import logging
 import urllib.parse
-import urllib.request
+from datetime import UTC, datetime
+from itertools import batched
 
-EXPO_PUSH_URL = "https://exp.host/--/api/v2/push/send"
+import httpx
+from sqlalchemy import func, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
 
+from ..config import settings
+from ..database.database import unit_of_work
+from ..database.entities import NotificationOutbox, NotificationStatus, User
 
-def send_push_notification(push_token: str, title: str, body: str, data: dict) -> None:
-    payload = json.dumps(
-        {
-            "to": push_token,
-            "title": title,
-            "body": body,
-            "data": data,
-            "sound": "default",
-        }
-    ).encode("utf-8")
+# Expo rejects push requests with more than 100 messages and receipt
+# requests with more than 1000 ids.
+EXPO_MAX_BATCH_SIZE = 100
+EXPO_MAX_RECEIPT_IDS = 1000
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+LOCAL_HOSTS = {"localhost", "127.0.0.1", "::1"}
+
+# Owned by the shared event loop; only touched from its thread.
+_client: httpx.AsyncClient | None = None
+_receipt_checks: set[asyncio.Task] = set()
+_stats = {"requests": 0, "retries": 0, "tokens_cleared": 0}
 
-    if urllib.parse.urlparse(EXPO_PUSH_URL).scheme != "https":
-        logging.error("Expo push URL must use HTTPS")
-        return
 
-    request = urllib.request.Request(  # noqa: S310
-        EXPO_PUSH_URL,
-        data=payload,
-        headers={"Content-Type": "application/json", "Accept": "application/json"},
-        method="POST",
+def _is_allowed_url(url: str) -> bool:
+    # Plain HTTP is only accepted for a local stub server.
+    parsed = urllib.parse.urlparse(url)
+    return parsed.scheme == "https" or (
+        parsed.scheme == "http" and parsed.hostname in LOCAL_HOSTS
     )
 
-    try:
-        with urllib.request.urlopen(request, timeout=10) as response:  # noqa: S310
-            result = response.read().decode("utf-8")
-            logging.info(f"Expo push response: {result}")
-    except Exception as e:
-        logging.error(f"Failed to send push notification: {e}")
+
+def enqueue_push_notification(
+    db: Session, user_id: int, title: str, body: str, data: dict
+) -> None:
+    """
+    Add a push notification to the outbox. It is only sent once the caller
+    commits, so it goes out together with the change it announces or not at
+    all.
+    """
+    db.add(NotificationOutbox(user_id=user_id, title=title, body=body, data=data))
+
+
+def build_push_message(push_token: str, title: str, body: str, data: dict) -> dict:
+    return {
+        "to": push_token,
+        "title": title,
+        "body": body,
+        "data": data,
+        "sound": "default",
+    }
+
+
+def _get_client() -> httpx.AsyncClient:
+    global _client  # noqa: PLW0603
+    if _client is None:
+        _client = httpx.AsyncClient(
+            http2=True,
+            headers={"Accept": "application/json", "Accept-Encoding": "gzip"},
+            timeout=settings.push_timeout_seconds,
+        )
+    return _client
+
+
+async def _post_with_retries(url: str, payload: list | dict) -> dict:
+    attempt = 0
+    while True:
+        try:
+            _stats["requests"] += 1
+            response = await _get_client().post(url, json=payload)
+            if response.status_code not in RETRYABLE_STATUS_CODES:
+                response.raise_for_status()
+                return response.json()
+            error = f"HTTP {response.status_code}"
+        except httpx.TransportError as e:
+            error = repr(e)
+        if attempt >= settings.push_max_retries:
+            raise RuntimeError(
+                f"Expo request failed after {attempt + 1} attempts: {error}"
+            )
+        delay = settings.push_retry_backoff_seconds * 2**attempt
+        attempt += 1
+        _stats["retries"] += 1
+        logging.warning(f"Expo request failed ({error}), retrying in {delay:.1f}s")
+        await asyncio.sleep(delay)
+
+
+async def send_push_messages(messages: list[dict]) -> list[dict]:
+    """
+    Send up to 100 messages in one request and return Expo's tickets in
+    the same order. Tokens Expo reports as unregistered are cleared, and the
+    receipts of accepted messages are checked later.
+    """
+    if len(messages) > EXPO_MAX_BATCH_SIZE:
+        raise ValueError(f"Expo accepts at most {EXPO_MAX_BATCH_SIZE} messages")
+    if not _is_allowed_url(settings.expo_push_url):
+        raise ValueError("Expo push URL must use HTTPS")
+
+    result = await _post_with_retries(settings.expo_push_url, messages)
+    if "errors" in result:
+        raise RuntimeError(f"Expo rejected the push request: {result['errors']}")
+
+    tickets = result["data"]
+    receipt_tokens: dict[str, str] = {}
+    unregistered: list[str] = []
+    for message, ticket in zip(messages, tickets, strict=True):
+        if ticket["status"] == "ok":
+            receipt_tokens[ticket["id"]] = message["to"]
+        elif is_unregistered_device(ticket):
+            unregistered.append(message["to"])
+        else:
+            logging.error(f"Expo push to {message['to']} failed: {ticket}")
+
+    if unregistered:
+        await _clear_push_tokens(unregistered)
+    if receipt_tokens:
+        task = asyncio.create_task(_check_receipts_later(receipt_tokens))
+        _receipt_checks.add(task)
+        task.add_done_callback(_receipt_checks.discard)
+    return tickets
+
+
+def is_unregistered_device(ticket: dict) -> bool:
+    return (ticket.get("details") or {}).get("error") == "DeviceNotRegistered"
+
+
+async def _check_receipts_later(receipt_tokens: dict[str, str]) -> None:
+    """
+    Expo only reports whether a message reached the device some time after
+    accepting it, so receipts are fetched once `push_receipt_delay_seconds`
+    have passed.
+    """
+    await asyncio.sleep(settings.push_receipt_delay_seconds)
+    if not _is_allowed_url(settings.expo_receipts_url):
+        logging.error("Expo receipts URL must use HTTPS")
+        return
+
+    unregistered: list[str] = []
+    for ids in batched(receipt_tokens, EXPO_MAX_RECEIPT_IDS):
+        try:
+            result = await _post_with_retries(
+                settings.expo_receipts_url, {"ids": list(ids)}
+            )
+        except Exception:
+            logging.exception(f"Failed to fetch {len(ids)} Expo push receipts")
+            continue
+        for receipt_id, receipt in result.get("data", {}).items():
+            if receipt["status"] == "ok":
+                continue
+            if is_unregistered_device(receipt):
+                unregistered.append(receipt_tokens[receipt_id])
+            else:
+                logging.error(f"Expo push receipt {receipt_id} failed: {receipt}")
+
+    if unregistered:
+        await _clear_push_tokens(unregistered)
+
+
+def _clear_tokens_in_db(push_tokens: list[str]) -> int:
+    with unit_of_work() as db:
+        return db.execute(
+            update(User).where(User.push_token.in_(push_tokens)).values(push_token=None)
+        ).rowcount
+
+
+async def _clear_push_tokens(push_tokens: list[str]) -> None:
+    cleared = await asyncio.to_thread(_clear_tokens_in_db, push_tokens)
+    _stats["tokens_cleared"] += cleared
+    logging.info(f"Cleared {cleared} push tokens of unregistered devices.")
+
+
+def get_push_stats() -> dict[str, int]:
+    return {**_stats, "receipt_checks": len(_receipt_checks)}
+
+
+async def get_outbox_backlog(db: AsyncSession) -> dict[str, float | int]:
+    pending, oldest = (
+        await db.execute(
+            select(func.count(), func.min(NotificationOutbox.created_at)).where(
+                NotificationOutbox.status == NotificationStatus.PENDING
+            )
+        )
+    ).one()
+    oldest_age = (datetime.now(UTC) - oldest).total_seconds() if oldest else 0.0
+    return {"pending": pending, "oldest_pending_seconds": round(oldest_age, 1)}
+
+
+async def close_push_client() -> None:
+    """Close the pooled client and abandon receipt checks still waiting."""
+    global _client  # noqa: PLW0603
+    for task in list(_receipt_checks):
+        task.cancel()
+    if _client is not None:
+        await _client.aclose()
+        _client = None
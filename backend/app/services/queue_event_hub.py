@@ -0,0 +1,78 @@
+import asyncio
+import threading
+from collections.abc import Generator
+from contextlib import contextmanager, suppress
+
+# Requests in this process waiting for queue events, with the event loop
+# each one runs on. Events arrive on the queue listener thread and are fed
+# from every replica.
+type _Waiter = tuple[asyncio.AbstractEventLoop, asyncio.Event]
+type _Stream = tuple[asyncio.AbstractEventLoop, asyncio.Queue[dict]]
+
+STREAM_BUFFER_SIZE = 100
+
+_essay_waiters: dict[int, set[_Waiter]] = {}
+_user_streams: dict[int, set[_Stream]] = {}
+_lock = threading.Lock()
+
+
+@contextmanager
+def _subscribe[S](subscribers: dict[int, set[S]], key: int, subscriber: S):
+    with _lock:
+        subscribers.setdefault(key, set()).add(subscriber)
+    try:
+        yield
+    finally:
+        with _lock:
+            key_subscribers = subscribers.get(key, set())
+            key_subscribers.discard(subscriber)
+            if not key_subscribers:
+                subscribers.pop(key, None)
+
+
+@contextmanager
+def subscribe_to_essay(essay_id: int) -> Generator[asyncio.Event, None, None]:
+    """
+    Yield an event that is set on the next queue event for `essay_id`.
+    Subscribe before reading the current state so no change is missed.
+    """
+    waiter = (asyncio.get_running_loop(), asyncio.Event())
+    with _subscribe(_essay_waiters, essay_id, waiter):
+        yield waiter[1]
+
+
+@contextmanager
+def subscribe_to_user(user_id: int) -> Generator[asyncio.Queue[dict], None, None]:
+    """
+    Yield a queue receiving every queue event of the user's essays. A
+    consumer that falls `STREAM_BUFFER_SIZE` events behind misses new ones.
+    """
+    stream = (asyncio.get_running_loop(), asyncio.Queue(STREAM_BUFFER_SIZE))
+    with _subscribe(_user_streams, user_id, stream):
+        yield stream[1]
+
+
+def _offer(queue: asyncio.Queue[dict], event: dict) -> None:
+    with suppress(asyncio.QueueFull):
+        queue.put_nowait(event)
+
+
+def notify_subscribers(event: dict) -> None:
+    with _lock:
+        waiters = list(_essay_waiters.get(event["essay_id"], ()))
+        streams = list(_user_streams.get(event["user_id"], ()))
+    # A loop is closed if the app shut down while a request was waiting.
+    for loop, essay_event in waiters:
+        with suppress(RuntimeError):
+            loop.call_soon_threadsafe(essay_event.set)
+    for loop, queue in streams:
+        with suppress(RuntimeError):
+            loop.call_soon_threadsafe(_offer, queue, event)
+
+
+def subscriber_counts() -> dict[str, int]:
+    with _lock:
+        return {
+            "status_long_polls": sum(map(len, _essay_waiters.values())),
+            "event_streams": sum(map(len, _user_streams.values())),
+        }
@@ -0,0 +1,49 @@
+import json
+from enum import StrEnum
+
+from sqlalchemy import Select, func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from ..database.entities import EssayProcessingQueue
+
+ESSAY_QUEUE_CHANNEL = "essay_queue_events"
+
+
+class ProcessingStage(StrEnum):
+    """Partial results of an essay that were just committed."""
+
+    EXTRACTION = "extraction"
+    CEFR = "cefr"
+    FEEDBACK = "feedback"
+
+
+def _queue_event_statement(
+    entry: EssayProcessingQueue, stage: ProcessingStage | None
+) -> Select:
+    payload = {
+        "entry_id": entry.id,
+        "essay_id": entry.essay_id,
+        "user_id": entry.user_id,
+        "status": entry.status,
+        "stage": stage,
+    }
+    return select(func.pg_notify(ESSAY_QUEUE_CHANNEL, json.dumps(payload)))
+
+
+def publish_queue_event(
+    db: Session, entry: EssayProcessingQueue, stage: ProcessingStage | None = None
+) -> None:
+    """
+    Announce the entry's current status, and the stage whose results are
+    being stored if any, on the essay queue channel. Postgres only delivers
+    the notification once `db` commits, so listeners never see a status or
+    result that was rolled back.
+    """
+    db.execute(_queue_event_statement(entry, stage))
+
+
+async def publish_queue_event_async(
+    db: AsyncSession, entry: EssayProcessingQueue
+) -> None:
+    await db.execute(_queue_event_statement(entry, None))
@@ -1,6 +1,16 @@
-from ..database.database import get_db
+import json
+import time
+from dataclasses import dataclass
+
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..config import settings
+from ..database.async_helpers import single_entry_to_db
 from ..database.entities import User
-from ..database.helpers import single_entry_to_db
+from .helpers.ttl_cache import TtlCache
+
+USER_CACHE_CHANNEL = "user_cache_events"
 
 
 class UserAlreadyExistsError(Exception):
@@ -9,26 +19,90 @@ class UserAlreadyExistsError(Exception):
         super().__init__(f"User with uuid {uuid} already exists")
 
 
-def get_user_by_uuid(uuid: str) -> User | None:
-    with get_db() as db:
-        return db.query(User).filter(User.uuid == uuid).first()
+@dataclass(frozen=True, slots=True)
+class UserSnapshot:
+    """Detached copy of the user fields authenticated routes rely on."""
+
+    id: int
+    uuid: str
+    username: str
+    target_cefr_level: str | None
+
+
+user_cache: TtlCache[str, UserSnapshot] = TtlCache(
+    settings.user_cache_max_entries, settings.user_cache_ttl_seconds
+)
+_lookup_stats = {"lookups": 0, "lookup_seconds": 0.0}
+
+
+async def get_user_by_uuid(db: AsyncSession, uuid: str) -> User | None:
+    return await db.scalar(select(User).where(User.uuid == uuid))
+
+
+async def get_user_snapshot(db: AsyncSession, uuid: str) -> UserSnapshot | None:
+    """
+    Resolve the user behind a request, served from `user_cache` when
+    possible. Unknown uuids are not cached so a user created on another
+    replica is found straight away.
+    """
+    snapshot = user_cache.get(uuid)
+    if snapshot is not None:
+        return snapshot
+
+    started = time.perf_counter()
+    row = (
+        await db.execute(
+            select(User.id, User.uuid, User.username, User.target_cefr_level).where(
+                User.uuid == uuid
+            )
+        )
+    ).first()
+    _lookup_stats["lookups"] += 1
+    _lookup_stats["lookup_seconds"] += time.perf_counter() - started
+    if row is None:
+        return None
+
+    snapshot = UserSnapshot(*row)
+    user_cache.set(uuid, snapshot)
+    return snapshot
+
+
+def invalidate_cached_user(event: dict) -> None:
+    user_cache.pop(event["uuid"])
+
+
+def get_user_cache_stats() -> dict[str, int | float]:
+    stats = user_cache.stats()
+    lookups = _lookup_stats["lookups"]
+    avg_lookup_ms = _lookup_stats["lookup_seconds"] * 1000 / lookups if lookups else 0.0
+    return {
+        **stats,
+        "avg_lookup_ms": round(avg_lookup_ms, 3),
+        "estimated_saved_ms": round(stats["hits"] * avg_lookup_ms, 1),
+    }
 
 
-def update_user(uuid: str, **kwargs: object) -> User | None:
-    with get_db() as db:
-        user = db.query(User).filter(User.uuid == uuid).first()
-        if user is None:
-            return None
-        for key, value in kwargs.items():
-            setattr(user, key, value)
-        db.commit()
-        db.refresh(user)
-        return user
+async def update_user(db: AsyncSession, uuid: str, **kwargs: object) -> User | None:
+    user = await get_user_by_uuid(db, uuid)
+    if user is None:
+        return None
+    for key, value in kwargs.items():
+        setattr(user, key, value)
+    # Delivered on commit, so every replica drops its cached copy.
+    await db.execute(
+        select(func.pg_notify(USER_CACHE_CHANNEL, json.dumps({"uuid": uuid})))
+    )
+    await db.commit()
+    user_cache.pop(uuid)
+    await db.refresh(user)
+    return user
 
 
-def create_user(uuid: str, **kwargs: object) -> User:
-    existing = get_user_by_uuid(uuid)
+async def create_user(db: AsyncSession, uuid: str, **kwargs: object) -> User:
+    existing = await get_user_by_uuid(db, uuid)
     if existing:
         raise UserAlreadyExistsError(uuid)
 
-    return single_entry_to_db(User, {"uuid": uuid, **kwargs})
+    user = await single_entry_to_db(db, User, {"uuid": uuid, **kwargs})
+    await db.commit()
+    return user
@@ -1,48 +1,61 @@
-from ..database.database import get_db
+from sqlalchemy import delete, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..database.async_helpers import single_entry_to_db
 from ..database.entities import WriteEssayDraft
-from ..database.helpers import delete_by_id, single_entry_to_db, update_by_id
 
 
-def get_drafts_by_user(user_id: int) -> list[WriteEssayDraft]:
-    with get_db() as db:
-        return (
-            db.query(WriteEssayDraft).filter(WriteEssayDraft.user_id == user_id).all()
-        )
+async def get_drafts_by_user(db: AsyncSession, user_id: int) -> list[WriteEssayDraft]:
+    drafts = await db.scalars(
+        select(WriteEssayDraft).where(WriteEssayDraft.user_id == user_id)
+    )
+    return list(drafts)
 
 
-def get_draft_by_id(draft_id: int, user_id: int) -> WriteEssayDraft | None:
-    with get_db() as db:
-        return (
-            db.query(WriteEssayDraft)
-            .filter(WriteEssayDraft.id == draft_id, WriteEssayDraft.user_id == user_id)
-            .first()
+async def get_draft_by_id(
+    db: AsyncSession, draft_id: int, user_id: int
+) -> WriteEssayDraft | None:
+    return await db.scalar(
+        select(WriteEssayDraft).where(
+            WriteEssayDraft.id == draft_id, WriteEssayDraft.user_id == user_id
         )
+    )
 
 
-def create_draft(
-    user_id: int, title: str | None, content: str | None
+async def create_draft(
+    db: AsyncSession, user_id: int, title: str | None, content: str | None
 ) -> WriteEssayDraft:
-    return single_entry_to_db(
+    draft = await single_entry_to_db(
+        db,
         WriteEssayDraft,
         {"user_id": user_id, "title": title, "content": content},
     )
+    await db.commit()
+    return draft
 
 
-def update_draft(
-    draft_id: int, user_id: int, title: str | None, content: str | None
+async def update_draft(
+    db: AsyncSession,
+    draft_id: int,
+    user_id: int,
+    title: str | None,
+    content: str | None,
 ) -> WriteEssayDraft | None:
-    draft = get_draft_by_id(draft_id, user_id)
-    if not draft:
-        return None
-    return update_by_id(
-        WriteEssayDraft,
-        draft_id,
-        {"title": title, "content": content},
+    draft = await db.scalar(
+        update(WriteEssayDraft)
+        .where(WriteEssayDraft.id == draft_id, WriteEssayDraft.user_id == user_id)
+        .values(title=title, content=content)
+        .returning(WriteEssayDraft)
     )
+    await db.commit()
+    return draft
 
 
-def delete_draft(draft_id: int, user_id: int) -> WriteEssayDraft | None:
-    draft = get_draft_by_id(draft_id, user_id)
-    if not draft:
-        return None
-    return delete_by_id(WriteEssayDraft, draft_id)
+async def delete_draft(db: AsyncSession, draft_id: int, user_id: int) -> int | None:
+    deleted_id = await db.scalar(
+        delete(WriteEssayDraft)
+        .where(WriteEssayDraft.id == draft_id, WriteEssayDraft.user_id == user_id)
+        .returning(WriteEssayDraft.id)
+    )
+    await db.commit()
+    return deleted_id
@@ -0,0 +1,169 @@
+"""
+Expo push dispatcher tests against a local stub of the Expo push API.
+
+The stub runs on 127.0.0.1 over plain HTTP, which the dispatcher only
+accepts for local hosts. Run from `backend/` with `python -m pytest tests`;
+no database is needed, clearing tokens is recorded instead of written.
+"""
+
+import asyncio
+import json
+import threading
+import time
+from collections.abc import Generator
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from itertools import pairwise
+
+import pytest
+from pydantic import ValidationError
+
+try:
+    from app.services import notification_service
+except ValidationError:
+    pytest.skip("app settings are not configured", allow_module_level=True)
+
+from app.config import settings
+
+REGISTERED = "ExponentPushToken[registered]"
+UNREGISTERED = "ExponentPushToken[unregistered]"
+
+
+class StubExpo(ThreadingHTTPServer):
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), StubExpoHandler)
+        # Status codes to answer with before accepting a request.
+        self.failures: list[int] = []
+        self.requests: list[tuple[float, list[dict]]] = []
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}/push/send"
+
+
+class StubExpoHandler(BaseHTTPRequestHandler):
+    server: StubExpo
+
+    def do_POST(self):
+        messages = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        self.server.requests.append((time.monotonic(), messages))
+        if self.server.failures:
+            self._reply(self.server.failures.pop(0), {"errors": ["try again"]})
+            return
+        tickets = [
+            {
+                "status": "error",
+                "message": "not registered",
+                "details": {"error": "DeviceNotRegistered"},
+            }
+            if message["to"] == UNREGISTERED
+            else {"status": "ok", "id": f"ticket-{index}"}
+            for index, message in enumerate(messages)
+        ]
+        self._reply(200, {"data": tickets})
+
+    def _reply(self, status: int, payload: dict) -> None:
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def expo(monkeypatch: pytest.MonkeyPatch) -> Generator[StubExpo, None, None]:
+    server = StubExpo()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    monkeypatch.setattr(settings, "expo_push_url", server.url)
+    monkeypatch.setattr(settings, "push_max_retries", 3)
+    monkeypatch.setattr(settings, "push_retry_backoff_seconds", 0.05)
+    monkeypatch.setattr(settings, "push_receipt_delay_seconds", 3600)
+    try:
+        yield server
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+@pytest.fixture
+def cleared_tokens(monkeypatch: pytest.MonkeyPatch) -> list[str]:
+    cleared: list[str] = []
+
+    def clear_tokens(push_tokens: list[str]) -> int:
+        cleared.extend(push_tokens)
+        return len(push_tokens)
+
+    monkeypatch.setattr(notification_service, "_clear_tokens_in_db", clear_tokens)
+    return cleared
+
+
+def _send(messages: list[dict]) -> list[dict]:
+    async def send() -> list[dict]:
+        try:
+            return await notification_service.send_push_messages(messages)
+        finally:
+            # The pooled client and receipt checks belong to this loop.
+            await notification_service.close_push_client()
+
+    return asyncio.run(send())
+
+
+def _messages(count: int, push_token: str = REGISTERED) -> list[dict]:
+    return [
+        notification_service.build_push_message(
+            push_token, "Essay Ready", "done", {"n": n}
+        )
+        for n in range(count)
+    ]
+
+
+def test_full_batch_goes_out_in_one_request(expo: StubExpo):
+    tickets = _send(_messages(notification_service.EXPO_MAX_BATCH_SIZE))
+
+    assert len(expo.requests) == 1
+    assert len(expo.requests[0][1]) == notification_service.EXPO_MAX_BATCH_SIZE
+    assert all(ticket["status"] == "ok" for ticket in tickets)
+
+
+def test_oversized_batch_is_rejected(expo: StubExpo):
+    with pytest.raises(ValueError):
+        _send(_messages(notification_service.EXPO_MAX_BATCH_SIZE + 1))
+    assert not expo.requests
+
+
+@pytest.mark.parametrize("status", [429, 500, 503])
+def test_retryable_errors_are_retried_with_backoff(expo: StubExpo, status: int):
+    expo.failures = [status, status]
+
+    tickets = _send(_messages(3))
+
+    assert len(expo.requests) == 3
+    assert [ticket["status"] for ticket in tickets] == ["ok"] * 3
+    sent_at = [sent for sent, _ in expo.requests]
+    gaps = [later - earlier for earlier, later in pairwise(sent_at)]
+    backoff = settings.push_retry_backoff_seconds
+    assert gaps[0] >= backoff
+    assert gaps[1] >= 2 * backoff
+
+
+def test_gives_up_after_max_retries(expo: StubExpo):
+    expo.failures = [503] * (settings.push_max_retries + 1)
+
+    with pytest.raises(RuntimeError):
+        _send(_messages(1))
+    assert len(expo.requests) == settings.push_max_retries + 1
+
+
+def test_unregistered_devices_have_their_token_cleared(
+    expo: StubExpo, cleared_tokens: list[str]
+):
+    messages = _messages(2) + _messages(1, push_token=UNREGISTERED)
+
+    tickets = _send(messages)
+
+    assert [ticket["status"] for ticket in tickets] == ["ok", "ok", "error"]
+    assert cleared_tokens == [UNREGISTERED]
@@ -0,0 +1,88 @@
+"""
+PDF extraction pool tests: a worker that hangs or dies must not leave the
+pool unusable for later uploads.
+
+Run from `backend/` with `python -m pytest tests`; no database is needed.
+The hanging and crashing stand-ins run in the spawned pool workers, which
+import them from this module.
+"""
+
+import asyncio
+import os
+import time
+from collections.abc import Generator
+from pathlib import Path
+
+import pymupdf
+import pytest
+from pydantic import ValidationError
+
+try:
+    from app.services.helpers import pdf_services
+except ValidationError:
+    pytest.skip("app settings are not configured", allow_module_level=True)
+
+from app.config import settings
+
+
+def _hang(file_path: str) -> int:
+    time.sleep(600)
+    return 1
+
+
+def _crash(file_path: str) -> int:
+    os._exit(1)
+
+
+@pytest.fixture
+def pdf_pool(monkeypatch: pytest.MonkeyPatch) -> Generator[None, None, None]:
+    monkeypatch.setattr(settings, "pdf_process_count", 2)
+    monkeypatch.setattr(settings, "pdf_extract_timeout_seconds", 5.0)
+    pdf_services.shutdown_pdf_pool()
+    try:
+        yield
+    finally:
+        pdf_services.shutdown_pdf_pool()
+
+
+@pytest.fixture
+def essay_pdf(tmp_path: Path) -> str:
+    path = tmp_path / "essay.pdf"
+    with pymupdf.open() as doc:
+        doc.new_page().insert_text((50, 72), "Subject\nHello")
+        doc.save(path)
+    return str(path)
+
+
+def _extract(file_path: str) -> str:
+    return asyncio.run(pdf_services.extract_text_from_pdf(file_path))
+
+
+async def _extract_all(file_path: str, count: int) -> list[object]:
+    return await asyncio.gather(
+        *(pdf_services.extract_text_from_pdf(file_path) for _ in range(count)),
+        return_exceptions=True,
+    )
+
+
+def test_hung_workers_are_replaced(
+    pdf_pool: None, essay_pdf: str, monkeypatch: pytest.MonkeyPatch
+):
+    with monkeypatch.context() as patch:
+        patch.setattr(pdf_services, "count_pdf_pages", _hang)
+        # One hung PDF per worker, so nothing is left to serve later uploads.
+        results = asyncio.run(_extract_all(essay_pdf, settings.pdf_process_count))
+    assert all(isinstance(r, pdf_services.PdfExtractionError) for r in results)
+
+    assert "Hello" in _extract(essay_pdf)
+
+
+def test_crashed_worker_is_replaced(
+    pdf_pool: None, essay_pdf: str, monkeypatch: pytest.MonkeyPatch
+):
+    with monkeypatch.context() as patch:
+        patch.setattr(pdf_services, "count_pdf_pages", _crash)
+        with pytest.raises(pdf_services.PdfExtractionError):
+            _extract(essay_pdf)
+
+    assert "Hello" in _extract(essay_pdf)
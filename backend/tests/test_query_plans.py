@@ -0,0 +1,251 @@
+"""
+Query plan regression tests for the hot lookups.
+
+They need the Postgres configured for the app (e.g. `docker compose up db`)
+and run from `backend/` with `python -m pytest tests`. Everything is created
+in a throwaway schema inside one transaction that is rolled back at the
+end. Sequential scans are disabled for the session, so a plan that still
+reads a hot table in full means no index can serve the query.
+"""
+
+import datetime
+import json
+import re
+import uuid
+from collections.abc import Generator
+
+import pytest
+from pydantic import ValidationError
+
+try:
+    from app.database.database import engine
+except ValidationError:
+    pytest.skip("database settings are not configured", allow_module_level=True)
+
+from sqlalchemy import Connection, Executable, insert, select, text
+from sqlalchemy.exc import OperationalError
+
+from app.database.blob_store import compress_text, content_hash
+from app.database.entities import (
+    ACTIVE_PROCESSING_STATUSES,
+    Base,
+    ContentBlob,
+    Essay,
+    EssayAnalysis,
+    EssayProcessingArchive,
+    EssayProcessingQueue,
+    EssayProcessingStatus,
+    FeedbackItem,
+    User,
+)
+from app.database.helpers import build_claim_statement
+from app.database.partitions import ensure_archive_partitions
+from app.jobs.essay_builder import MAXIMUM_RETRIES
+from app.services.essay_services import (
+    essay_detail_query,
+    essay_page_query,
+    latest_processing_status,
+    processed_essay_query,
+)
+
+USERS = 50
+ESSAYS_PER_USER = 20
+PARTIAL_INDEXES = {"ix_essay_processing_queue_active"}
+HOT_TABLES = {
+    "users",
+    "content_blobs",
+    "essays",
+    "essay_analyses",
+    "feedback_items",
+    "essay_processing_queue",
+    "essay_processing_archive",
+}
+ARCHIVE_PARTITION = re.compile(r"_y\d{4}m\d{2}$")
+
+
+@pytest.fixture(scope="module")
+def conn() -> Generator[Connection, None, None]:
+    try:
+        connection = engine.connect()
+    except OperationalError:
+        pytest.skip("no Postgres to run EXPLAIN against")
+
+    schema = f"query_plans_{uuid.uuid4().hex[:8]}"
+    transaction = connection.begin()
+    connection.execute(text(f"CREATE SCHEMA {schema}"))
+    connection.execute(text(f"SET LOCAL search_path TO {schema}"))
+    Base.metadata.create_all(connection)
+    _seed(connection)
+    connection.execute(text("ANALYZE"))
+    connection.execute(text("SET LOCAL enable_seqscan = off"))
+    try:
+        yield connection
+    finally:
+        transaction.rollback()
+        connection.close()
+
+
+def _seed(connection: Connection) -> None:
+    active_statuses = ACTIVE_PROCESSING_STATUSES
+    user_ids = connection.scalars(
+        insert(User).returning(User.id),
+        [{"username": f"user-{i}", "uuid": str(uuid.uuid4())} for i in range(USERS)],
+    ).all()
+    content = content_hash("text")
+    connection.execute(
+        insert(ContentBlob).values(
+            sha256=content,
+            data=compress_text("text"),
+            size=4,
+            ref_count=USERS * ESSAYS_PER_USER * 5,
+        )
+    )
+    essays = connection.execute(
+        insert(Essay).returning(Essay.id, Essay.user_id),
+        [
+            {
+                "user_id": user_id,
+                "title": f"essay-{i}",
+                "original_content_sha256": content,
+                "content_fingerprint": f"{user_id}-{i}",
+            }
+            for user_id in user_ids
+            for i in range(ESSAYS_PER_USER)
+        ],
+    ).all()
+    connection.execute(
+        insert(EssayProcessingQueue),
+        [
+            {
+                "user_id": user_id,
+                "essay_id": essay_id,
+                # Like production, nearly every entry has finished.
+                "status": active_statuses[essay_id % len(active_statuses)]
+                if essay_id % 20 == 0
+                else EssayProcessingStatus.COMPLETED,
+                "raw_content_sha256": content,
+                "retries": 0,
+            }
+            for essay_id, user_id in essays
+        ],
+    )
+    # Earlier runs of the same essays, already moved to the archive.
+    now = datetime.datetime.now(datetime.UTC)
+    ensure_archive_partitions(connection, now - datetime.timedelta(days=90), now)
+    connection.execute(
+        insert(EssayProcessingArchive),
+        [
+            {
+                "id": -essay_id - month * USERS * ESSAYS_PER_USER,
+                "created_at": now - datetime.timedelta(days=30 * month),
+                "updated_at": now - datetime.timedelta(days=30 * month),
+                "user_id": user_id,
+                "essay_id": essay_id,
+                "status": EssayProcessingStatus.COMPLETED,
+                "raw_content_sha256": content,
+                "retries": 0,
+            }
+            for essay_id, user_id in essays
+            for month in range(3)
+        ],
+    )
+    connection.execute(
+        insert(EssayAnalysis),
+        [
+            {
+                "user_id": user_id,
+                "essay_id": essay_id,
+                "analysis_result": "ok",
+                "confidence": "HIGH",
+            }
+            for essay_id, user_id in essays
+        ],
+    )
+    connection.execute(
+        insert(FeedbackItem),
+        [
+            {
+                "user_id": user_id,
+                "essay_id": essay_id,
+                "feedback_origin": "TEACHER",
+                "category": "GRAMMAR",
+                "short_mistake_summary": "case",
+            }
+            for essay_id, user_id in essays
+            for _ in range(3)
+        ],
+    )
+
+
+def _full_scans(plan: dict) -> set[str]:
+    """
+    Tables read in full: sequential scans, and index scans without an index
+    condition, which walk a whole index (usually the primary key) instead.
+    """
+    scans = set()
+    walks_whole_index = (
+        plan["Node Type"] in {"Index Scan", "Index Only Scan"}
+        and "Index Cond" not in plan
+        and plan["Index Name"] not in PARTIAL_INDEXES
+    )
+    if plan["Node Type"] == "Seq Scan" or walks_whole_index:
+        scans.add(ARCHIVE_PARTITION.sub("", plan["Relation Name"]))
+    for child in plan.get("Plans", []):
+        scans |= _full_scans(child)
+    return scans
+
+
+def _explain(connection: Connection, statement: Executable) -> dict:
+    compiled = statement.compile(
+        dialect=connection.dialect, compile_kwargs={"literal_binds": True}
+    )
+    result = connection.exec_driver_sql(
+        f"EXPLAIN (FORMAT JSON) {compiled}"
+    ).scalar_one()
+    if isinstance(result, str):
+        result = json.loads(result)
+    return result[0]["Plan"]
+
+
+HOT_QUERIES = {
+    "user by uuid": lambda: select(User).where(User.uuid == "missing"),
+    "essay page": lambda: essay_page_query(user_id=1, limit=20),
+    "essay page after cursor": lambda: essay_page_query(user_id=1, limit=20, cursor=10),
+    "essay by title and user": lambda: select(Essay).where(
+        Essay.title == "essay-1", Essay.user_id == 1
+    ),
+    "essay by content for user": lambda: select(Essay.id).where(
+        Essay.content_fingerprint == "missing", Essay.user_id == 1
+    ),
+    "processed essay by content": lambda: processed_essay_query("missing", "B2"),
+    "essay detail": lambda: essay_detail_query(essay_id=1, user_id=1),
+    "archived essay status": lambda: select(latest_processing_status(Essay.id)).where(
+        Essay.id == 1
+    ),
+    "claim pending essays": lambda: build_claim_statement(
+        EssayProcessingQueue,
+        "status",
+        [EssayProcessingStatus.PENDING, EssayProcessingStatus.ERROR],
+        EssayProcessingStatus.PROCESSING,
+        4,
+        "test",
+        900,
+        EssayProcessingQueue.retries < MAXIMUM_RETRIES,
+    ),
+    "claim essays for feedback": lambda: build_claim_statement(
+        EssayProcessingQueue,
+        "status",
+        [EssayProcessingStatus.READY_FOR_FEEDBACK_EXTRACTION],
+        EssayProcessingStatus.FEEDBACK_EXTRACTION,
+        4,
+        "test",
+        900,
+        EssayProcessingQueue.retries < MAXIMUM_RETRIES,
+    ),
+}
+
+
+@pytest.mark.parametrize("name", HOT_QUERIES)
+def test_hot_query_uses_indexes(conn: Connection, name: str):
+    plan = _explain(conn, HOT_QUERIES[name]())
+    assert not _full_scans(plan) & HOT_TABLES, json.dumps(plan, indent=2)
@@ -1,5 +1,5 @@
 import { useCallback, useEffect, useState } from 'react';
-import { FlatList, RefreshControl } from 'react-native';
+import { ActivityIndicator, FlatList, RefreshControl } from 'react-native';
 import { useRouter } from 'expo-router';
 
 import Essay from '@/components/essay/Essay';
@@ -12,6 +12,8 @@ import { useEssayDataStore } from '@/store/essayData';
 export default function EssaysScreen() {
     const essays = useEssayDataStore((state) => state.essays);
     const fetchEssays = useEssayDataStore((state) => state.fetchEssays);
+    const fetchMoreEssays = useEssayDataStore((state) => state.fetchMoreEssays);
+    const loadingMore = useEssayDataStore((state) => state.loadingMore);
     const fetchEssayDetail = useEssayDataStore((state) => state.fetchEssayDetail);
     const tintColor = useThemeColor({}, 'tint');
     const [refreshing, setRefreshing] = useState(false);
@@ -44,6 +46,9 @@ export default function EssaysScreen() {
                 )}
                 ListHeaderComponent={<ThemedText type="title">Essays</ThemedText>}
                 ListEmptyComponent={<ThemedText>No essays yet.</ThemedText>}
+                ListFooterComponent={loadingMore ? <ActivityIndicator color={tintColor} /> : null}
+                onEndReached={() => void fetchMoreEssays()}
+                onEndReachedThreshold={0.5}
                 refreshControl={
                     <RefreshControl
                         refreshing={refreshing}
@@ -43,29 +43,54 @@ export interface EssayStatusResponse {
 
 interface EssayDataState {
     essays: EssayResponse[]
+    nextCursor: string | null
+    loadingMore: boolean
     selectedEssay: EssayDetailResponse | null
     fetchEssays: () => Promise<void>
+    fetchMoreEssays: () => Promise<void>
     fetchEssayDetail: (essay_id: number) => Promise<boolean>
     clearAll: () => void
 }
 
 export const useEssayDataStore = create<EssayDataState>()(
     persist(
-        (set) => ({
+        (set, get) => ({
             essays: [] as EssayResponse[],
+            nextCursor: null,
+            loadingMore: false,
             selectedEssay: null,
 
+            // Loads the first page; later pages are loaded on scroll.
             fetchEssays: async () => {
                 try {
-                    const response = await getEssays()
-                    set({ essays: response })
+                    const page = await getEssays()
+                    set({ essays: page.essays, nextCursor: page.nextCursor })
                 } catch (error) {
                     console.error("Error fetching essays:", error)
                 }
             },
 
+            fetchMoreEssays: async () => {
+                const { nextCursor, loadingMore } = get()
+                if (!nextCursor || loadingMore) {
+                    return
+                }
+                set({ loadingMore: true })
+                try {
+                    const page = await getEssays(nextCursor)
+                    set((state) => ({
+                        essays: [...state.essays, ...page.essays],
+                        nextCursor: page.nextCursor,
+                    }))
+                } catch (error) {
+                    console.error("Error fetching more essays:", error)
+                } finally {
+                    set({ loadingMore: false })
+                }
+            },
+
             clearAll: () => {
-                set({ essays: [], selectedEssay: null })
+                set({ essays: [], nextCursor: null, selectedEssay: null })
             },
 
             fetchEssayDetail: async (essay_id: number) => {
@@ -82,6 +107,7 @@ export const useEssayDataStore = create<EssayDataState>()(
         {
             name: 'essay-data',
             storage: createJSONStorage(() => AsyncStorage),
+            partialize: (state) => ({ essays: state.essays, nextCursor: state.nextCursor, selectedEssay: state.selectedEssay }),
         }
     )
 )
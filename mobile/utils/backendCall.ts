@@ -1,4 +1,4 @@
-import axios, { type AxiosRequestConfig } from "axios";
+import axios, { type AxiosRequestConfig, type AxiosResponse } from "axios";
 
 import { useUserDataStore } from "../store/userData";
 
@@ -13,11 +13,10 @@ interface BackendCallParams {
 
 const MAX_RETRIES = 2;
 
-async function attemptRequest(config: AxiosRequestConfig, attempt: number): Promise<unknown> {
+async function attemptRequest(config: AxiosRequestConfig, attempt: number): Promise<AxiosResponse> {
     try {
 
-        const response = await axios(config);
-        return response.data;
+        return await axios(config);
     } catch (error) {
         if (attempt < MAX_RETRIES) {
             console.warn(`Request failed, retrying... (${attempt + 1}/${MAX_RETRIES})`);
@@ -27,7 +26,12 @@ async function attemptRequest(config: AxiosRequestConfig, attempt: number): Prom
     }
 }
 
-export async function backendCall({ method, urlExtension, body = null }: BackendCallParams) {
+export async function backendCall(params: BackendCallParams) {
+    const response = await backendCallWithHeaders(params);
+    return response.data;
+}
+
+export async function backendCallWithHeaders({ method, urlExtension, body = null }: BackendCallParams): Promise<AxiosResponse> {
     console.info('Request URL:', `${apiBaseUrl}${urlExtension}`);
     const { clearAll, uuid } = useUserDataStore.getState();
 
@@ -1,13 +1,24 @@
 import type { EssayResponse, EssayStatusResponse } from "../store/essayData";
 
-import { backendCall } from "./backendCall";
+import { backendCall, backendCallWithHeaders } from "./backendCall";
 
-export const getEssays = async (): Promise<EssayResponse[]> => {
-    const data = await backendCall({
-        urlExtension: "/essay/all",
+const ESSAY_PAGE_SIZE = 20;
+
+export interface EssayPage {
+    essays: EssayResponse[];
+    nextCursor: string | null;
+}
+
+export const getEssays = async (cursor?: string | null): Promise<EssayPage> => {
+    const query = cursor ? `&cursor=${cursor}` : "";
+    const response = await backendCallWithHeaders({
+        urlExtension: `/essay/all?limit=${ESSAY_PAGE_SIZE}${query}`,
         method: "GET",
     });
-    return data as EssayResponse[];
+    return {
+        essays: response.data as EssayResponse[],
+        nextCursor: response.headers["x-next-cursor"] ?? null,
+    };
 }
 
 export const getEssayDetail = async (essay_id: number): Promise<EssayStatusResponse> => {